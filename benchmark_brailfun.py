@@ -0,0 +1,128 @@
+""" Benchmark the brailfun signal generators against the fake gpio backend.
+
+For each signal type it reports the achieved pwm updates per second, how late the signal samples are,
+the deadline overshoot of time_on and time_off, the cpu time per letter and the memory allocated per letter.
+
+Ex. python benchmark_brailfun.py --time-on 0.5 --time-off 0.2 --output bench.json
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+import brailfun
+import hardware
+from benchmark_report import commit, write_report
+
+SIGNAL_NAMES = {1: "square", 2: "triangle", 3: "ramp", 4: "exponential", 5: "logarithmic", 6: "sine", 7: "click", 8: "reverse click"}
+DOT_PATTERN = [1, 0, 1, 1, 0, 1]
+
+def measure_letter(braille_cell: brailfun.NewCell, pi: hardware.FakePi, play) -> dict:
+    """Trigger one letter and measure it from the calls recorded by the fake gpio session.
+
+    Parameters
+    ----------
+    braille_cell : brailfun.NewCell
+        Cell driven by the fake gpio session.
+    pi : hardware.FakePi
+        Fake gpio session.
+    play : callable
+        Plays DOT_PATTERN in the cell, through trigger or trigger_async.
+
+    Returns
+    -------
+    measurement: dict
+        Signal updates, update rate, sample lateness, deadline overshoots and cpu time of the letter.
+    """
+
+    signal_pin = braille_cell.braille_pins["signal_pin"]
+    pi.reset()
+
+    cpu_ini = time.process_time()
+    t_ini = time.perf_counter()
+    play()
+    t_end = time.perf_counter()
+    cpu_time = time.process_time() - cpu_ini
+
+    # The last call of a letter switches the cell off (or polls the waveform end) right before time_off starts
+    t_off = pi.events[-1][0]
+    updates = [event for event in pi.events if event[1] == "set_PWM_dutycycle" and event[2][0] == signal_pin and event[0] < t_ini + braille_cell.time_on]
+
+    lateness = []
+    if updates and braille_cell.playback == "software":
+        steps = brailfun._envelope_steps(braille_cell.signal_type, braille_cell.power, braille_cell.time_on, braille_cell.update_rate)
+        t_first = updates[0][0]
+        lateness = [event[0] - t_first - offset for event, (offset, _) in zip(updates, steps)]
+
+    return {
+        "updates": len(updates),
+        "updates_per_s": len(updates)/braille_cell.time_on,
+        "lateness_mean_ms": statistics.mean(lateness)*1e3 if lateness else 0.0,
+        "lateness_max_ms": max(lateness)*1e3 if lateness else 0.0,
+        "time_on_overshoot_ms": (t_off - t_ini - braille_cell.time_on)*1e3,
+        "time_off_overshoot_ms": (t_end - t_off - braille_cell.time_off)*1e3,
+        "cpu_ms": cpu_time*1e3,
+        "pigpio_calls": pi.count(),
+    }
+
+def benchmark_signal(signal_type: int, args) -> dict:
+    """Benchmark one signal type, the first letter fills the envelope cache and is not measured."""
+
+    pi = hardware.FakePi(call_latency=args.call_latency)
+    brailfun.NewCell.use_backend(pi)
+    braille_cell = brailfun.NewCell(power=args.power, time_on=args.time_on, time_off=args.time_off, signal_type=signal_type, update_rate=args.update_rate, playback=args.playback, stats=args.stats)
+    braille_cell.init()
+
+    if args.api == "async":
+        loop = asyncio.new_event_loop()
+        play = lambda: loop.run_until_complete(braille_cell.trigger_async(DOT_PATTERN))
+    else:
+        play = lambda: braille_cell.trigger(DOT_PATTERN)
+
+    play()
+    letters = [measure_letter(braille_cell, pi, play) for _ in range(args.letters)]
+    result = {key: statistics.mean(letter[key] for letter in letters) for key in letters[0]}
+    result["time_on_overshoot_max_ms"] = max(letter["time_on_overshoot_ms"] for letter in letters)
+    result["time_off_overshoot_max_ms"] = max(letter["time_off_overshoot_ms"] for letter in letters)
+
+    tracemalloc.start()
+    play()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if args.api == "async":
+        loop.close()
+    result["memory_current_bytes"] = current
+    result["memory_peak_bytes"] = peak
+    if args.stats:
+        result["stats"] = braille_cell.stats()
+
+    return {"signal_type": signal_type, "signal": SIGNAL_NAMES[signal_type], **result}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the brailfun signal generators against the fake gpio backend.")
+    parser.add_argument("--signals", type=int, nargs="+", default=list(SIGNAL_NAMES), help="signal types to benchmark, all by default")
+    parser.add_argument("--power", type=int, default=5)
+    parser.add_argument("--time-on", type=float, default=0.5)
+    parser.add_argument("--time-off", type=float, default=0.2)
+    parser.add_argument("--update-rate", type=int, default=100)
+    parser.add_argument("--playback", default="software", choices=["software", "wave"])
+    parser.add_argument("--api", default="sync", choices=["sync", "async"], help="play the letters with trigger or trigger_async")
+    parser.add_argument("--letters", type=int, default=3, help="measured letters per signal type")
+    parser.add_argument("--call-latency", type=float, default=0.0, help="seconds each fake pigpio call takes, Ex. 0.0001 for pigpiod on a pi zero")
+    parser.add_argument("--stats", action="store_true", help="enable the cell stats and add its snapshot to the results")
+    parser.add_argument("--output", help="json file for the results, printed to stdout by default")
+    args = parser.parse_args()
+
+    report = {
+        "commit": commit(),
+        "config": vars(args),
+        "results": [benchmark_signal(signal_type, args) for signal_type in args.signals],
+    }
+
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+""" Benchmark the numpy nearest neighbours classifier against cv2.ml.KNearest.
+
+A synthetic training set of noisy 10x10 glyphs is generated for each size, both classifiers are trained with it and
+classify the same batch of rois. It reports the training time, the latency of a batch, the accuracy and how often both
+classifiers agree.
+
+Ex. python benchmark_knn.py --sizes 1000 10000 50000 --k 1 3 --output knn.json
+"""
+
+import argparse
+import string
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_report import commit, write_report
+from ocr_model import NearestNeighbours
+
+def glyphs(rng, prototypes: np.ndarray, count: int, noise: float) -> tuple:
+    """Noisy copies of random prototypes, a fraction noise of the pixels is inverted.
+
+    Returns
+    -------
+    samples, responses: tuple
+        (count, 100) float32 rois with 0 or 255 pixels and (count, 1) float32 character codes.
+    """
+
+    labels = rng.integers(0, len(prototypes), count)
+    flips = rng.random((count, 100)) < noise
+    samples = np.where(flips, 255 - prototypes[labels], prototypes[labels]).astype(np.float32)
+    responses = np.array([ord(string.ascii_lowercase[label]) for label in labels], np.float32).reshape(-1, 1)
+    return samples, responses
+
+def best_of(repeats: int, function) -> tuple:
+    """Best time in seconds of the repeated calls and the value returned by the last call."""
+
+    times = []
+    for _ in range(repeats):
+        t_ini = time.perf_counter()
+        value = function()
+        times.append(time.perf_counter() - t_ini)
+    return min(times), value
+
+def benchmark_size(size: int, args) -> list:
+    """Benchmark both classifiers with a training set of size samples, one result per k."""
+
+    rng = np.random.default_rng(args.seed)
+    prototypes = (rng.random((26, 100)) < 0.5).astype(np.float32)*255
+    samples, responses = glyphs(rng, prototypes, size, args.noise)
+    queries, answers = glyphs(rng, prototypes, args.queries, args.noise)
+
+    train_opencv, knearest = best_of(1, lambda: _train_opencv(samples, responses))
+    train_numpy, neighbours = best_of(1, lambda: NearestNeighbours(samples, responses))
+
+    results = []
+    for k in args.k:
+        latency_opencv, (_, opencv_results, _, _) = best_of(args.repeats, lambda: knearest.findNearest(queries, k))
+        latency_numpy, (_, numpy_results, _, _) = best_of(args.repeats, lambda: neighbours.findNearest(queries, k))
+        results.append({
+            "samples": size,
+            "k": k,
+            "queries": args.queries,
+            "opencv_train_ms": train_opencv*1e3,
+            "numpy_train_ms": train_numpy*1e3,
+            "opencv_batch_ms": latency_opencv*1e3,
+            "numpy_batch_ms": latency_numpy*1e3,
+            "opencv_accuracy": float(np.mean(opencv_results == answers)),
+            "numpy_accuracy": float(np.mean(numpy_results == answers)),
+            "agreement": float(np.mean(opencv_results == numpy_results)),
+        })
+
+    return results
+
+def _train_opencv(samples: np.ndarray, responses: np.ndarray):
+    knearest = cv2.ml.KNearest_create()
+    knearest.train(samples, cv2.ml.ROW_SAMPLE, responses)
+    return knearest
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the numpy nearest neighbours classifier against cv2.ml.KNearest.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="training set sizes")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3], help="neighbours that vote the character")
+    parser.add_argument("--queries", type=int, default=64, help="rois classified in each batch")
+    parser.add_argument("--noise", type=float, default=0.3, help="fraction of inverted pixels in the glyphs")
+    parser.add_argument("--repeats", type=int, default=5, help="batches timed, the best time is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="json file for the results, printed to stdout by default")
+    args = parser.parse_args()
+
+    report = {
+        "commit": commit(),
+        "config": vars(args),
+        "results": [result for size in args.sizes for result in benchmark_size(size, args)],
+    }
+
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+""" Benchmark the camera_reader ocr pipeline over a labelled corpus of page images.
+
+The corpus is a directory of images with a labels.csv file, one "file,text" row per image with the text the
+image should read, Ex. "page_001.png,hola". Images without a label count for the speed but not for the accuracy.
+
+For each preprocessing profile it reports frames/s, characters/s, the mean milliseconds of each pipeline stage, the
+character accuracy (1 - edit distance / label length over the whole corpus) and the exact reads. The peak RSS is
+reported once for the whole run, ru_maxrss never goes down and the profiles after the first would inherit its peak.
+
+Ex. python benchmark_ocr.py pages/ /home/pi/ocr_model --profiles default fast --output ocr.json
+"""
+
+import argparse
+import csv
+import os
+import resource
+import time
+
+from benchmark_report import commit, write_report
+from camera_reader import ImageDirectorySource, OcrCache, PROFILES, read_text
+from ocr_model import OcrModel
+
+LABELS_FILE = "labels.csv"
+
+def _peak_rss_kb() -> int:
+    # ru_maxrss is in kilobytes in linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def load_labels(corpus: str) -> dict:
+    """Text of each image of the corpus, empty if the corpus has no labels.csv."""
+
+    path = os.path.join(corpus, LABELS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as labels_file:
+        return {row[0]: row[1] for row in csv.reader(labels_file) if len(row) >= 2}
+
+def edit_distance(read: str, label: str) -> int:
+    """Levenshtein distance, the characters inserted, deleted or replaced to turn read into label."""
+
+    previous = list(range(len(label) + 1))
+    for i, read_character in enumerate(read, 1):
+        current = [i]
+        for j, label_character in enumerate(label, 1):
+            current.append(min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (read_character != label_character)))
+        previous = current
+    return previous[-1]
+
+def benchmark_profile(profile_name: str, model, labels: dict, args) -> dict:
+    """Read the corpus args.repeats times with a profile, the first pass warms up the model and is not measured."""
+
+    profile = PROFILES[profile_name]
+    ocr_cache = OcrCache() if args.cache else None
+    stages = {}
+    reads = {}
+    frames = 0
+    characters = 0
+    total_time = 0.0
+
+    for repeat in range(args.repeats + 1):
+        with ImageDirectorySource(args.corpus) as source:
+            for frame in source.frames():
+                timings = {}
+                text = read_text(frame, model, profile, ocr_cache, timings)
+                if repeat == 0:
+                    reads[source.name] = text
+                    continue
+
+                frames += 1
+                characters += len(text)
+                total_time += sum(timings.values())
+                for stage, seconds in timings.items():
+                    stages.setdefault(stage, []).append(seconds)
+
+    labelled = [name for name in reads if name in labels]
+    label_characters = sum(len(labels[name]) for name in labelled)
+    errors = sum(edit_distance(reads[name], labels[name]) for name in labelled)
+
+    result = {
+        "profile": profile_name,
+        "frames": frames,
+        "frames_per_s": frames/total_time if total_time else 0.0,
+        "characters_per_s": characters/total_time if total_time else 0.0,
+        # Per frame, the frames without characters end before the rois and classify stages
+        "stage_ms": {stage: sum(seconds)/frames*1e3 for stage, seconds in stages.items()} if frames else {},
+        "labelled_frames": len(labelled),
+        "character_accuracy": max(0.0, 1 - errors/label_characters) if label_characters else None,
+        "exact_reads": sum(reads[name] == labels[name] for name in labelled)/len(labelled) if labelled else None,
+    }
+    if ocr_cache is not None:
+        result["cache_hits"] = ocr_cache.hits
+        result["cache_misses"] = ocr_cache.misses
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the camera_reader ocr pipeline over a labelled corpus of page images.")
+    parser.add_argument("corpus", help=f"directory of images with a {LABELS_FILE} file")
+    parser.add_argument("model", help="ocr model directory, see ocr_model.py")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES), help="preprocessing profiles, all by default")
+    parser.add_argument("--engine", default="numpy", choices=["numpy", "opencv"])
+    parser.add_argument("--repeats", type=int, default=3, help="measured passes over the corpus")
+    parser.add_argument("--cache", action="store_true", help="use an OcrCache, kept between passes")
+    parser.add_argument("--output", help="json file for the results, printed to stdout by default")
+    args = parser.parse_args()
+
+    labels = load_labels(args.corpus)
+
+    t_ini = time.perf_counter()
+    model = OcrModel(args.model, engine=args.engine)
+    load_ms = (time.perf_counter() - t_ini)*1e3
+
+    report = {
+        "commit": commit(),
+        "config": vars(args),
+        "model_samples": len(model),
+        "model_load_ms": load_ms,
+        "results": [benchmark_profile(profile_name, model, labels, args) for profile_name in args.profiles],
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
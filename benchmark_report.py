@@ -0,0 +1,26 @@
+""" Report helpers shared by the benchmark scripts, every benchmark writes a json report tagged with the commit.
+
+Ex.
+    report = {"commit": commit(), "config": vars(args), "results": results}
+    write_report(report, args.output)
+"""
+
+import json
+import subprocess
+
+def commit() -> str:
+    """Short hash of the checked out commit, "" outside a git repository."""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def write_report(report: dict, output: str=None):
+    """Write a report to the output json file, printed to stdout if output is None."""
+
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -1,11 +1,290 @@
 """Create a cell object to control a braille cell through pwm signals in the gpio ports (BCM) in the raspberry pi zero."""
 
-import pigpio as GPIO
+import asyncio
 import math
 import time
 import random
+import queue
+import threading
 import unicodedata
-from typing import Union
+from functools import lru_cache
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Union
+
+import hardware
+
+_LN10 = math.log(10)
+
+# pigpio waveform playback, one pwm cycle per wave repeated with wave_chain loops
+_WAVE_PWM_PERIOD_US = 1000
+_WAVE_MAX_SEGMENTS = 80		# wave_chain accepts 600 bytes, each looped segment takes 7
+_WAVE_MAX_IDS = 200
+_WAVE_MAX_FAILURES = 3		# waveform failures in a row before a cell switches to software playback for good
+
+# asyncio timers wake up to ~2 ms late (the selector rounds its timeout up to milliseconds), the last
+# _ASYNC_TIMER_RESOLUTION seconds of a deadline are slept in slices yielding to the event loop between them
+_ASYNC_TIMER_RESOLUTION = 0.002
+_ASYNC_SLICE = 0.0005
+
+async def _sleep_until(deadline: float):
+	"""Await until time.perf_counter() reaches the deadline, the other tasks keep running meanwhile."""
+
+	delay = deadline - time.perf_counter() - _ASYNC_TIMER_RESOLUTION
+	if delay > 0:
+		await asyncio.sleep(delay)
+	remaining = deadline - time.perf_counter()
+	while remaining > _ASYNC_SLICE:
+		time.sleep(_ASYNC_SLICE)
+		await asyncio.sleep(0)
+		remaining = deadline - time.perf_counter()
+	if remaining > 0:
+		time.sleep(remaining)
+
+def _shape_square(x: float) -> float:
+	"""Square signal, constant full scale."""
+	return 255.0
+
+def _shape_triangle(x: float) -> float:
+	"""Triangle signal, linear rise until the middle of time_on and linear fall afterwards."""
+	return 510.0*x if x < 0.5 else 510.0*(1.0-x)
+
+def _shape_ramp(x: float) -> float:
+	"""Ramp signal, linear rise during time_on."""
+	return 255.0*x
+
+def _shape_exp(x: float) -> float:
+	"""Exponential signal, e^t remapped from -ln(10) to ln(10) and back."""
+	if x < 0.5:
+		return 25.5*math.exp(4*_LN10*x - _LN10)
+	return 25.5*math.exp(_LN10 - 4*_LN10*(x-0.5))
+
+def _shape_log(x: float) -> float:
+	"""Logarithmic signal, log10(t) remapped from 1 to 10 and back."""
+	if x < 0.5:
+		return 255.0*math.log10(18*x + 1)
+	return 255.0*math.log10(10 - 18*(x-0.5))
+
+def _shape_sine(x: float) -> float:
+	"""Sine signal (positive side)."""
+	return 255.0*math.sin(math.pi*x)
+
+def _shape_click(x: float) -> float:
+	"""Click signal, first half logarithmic, second half exponential."""
+	return _shape_log(x) if x < 0.5 else _shape_exp(x)
+
+def _shape_revclick(x: float) -> float:
+	"""Reverse click signal, first half exponential, second half logarithmic."""
+	return _shape_exp(x) if x < 0.5 else _shape_log(x)
+
+# Envelope shapes by signal_type, x is the fraction of time_on elapsed (0 to 1)
+_SIGNAL_SHAPES = {1: _shape_square, 2: _shape_triangle, 3: _shape_ramp, 4: _shape_exp, 5: _shape_log, 6: _shape_sine, 7: _shape_click, 8: _shape_revclick}
+
+@lru_cache(maxsize=64)
+def _envelope(signal_type: int, power: float, time_on: float, update_rate: int) -> bytes:
+	"""Sample a signal envelope into a duty-cycle table.
+
+	Parameters
+	----------
+	signal_type : int(1 to 8)
+		Activation signal type.
+	power : int(1 to 5)
+		Braille cell vibration power.
+	time_on : float
+		Activation signal time.
+	update_rate : int
+		Samples per second.
+
+	Returns
+	-------
+	envelope: bytes
+		One duty cycle (0 to 255) per sample, the table lasts time_on seconds.
+	"""
+
+	shape = _SIGNAL_SHAPES[signal_type]
+	scale = power/5.0
+	samples = max(1, round(time_on*update_rate))
+
+	return bytes(int(NewCell._clamp(shape(sample/samples)*scale)) for sample in range(samples))
+
+@lru_cache(maxsize=64)
+def _envelope_steps(signal_type: int, power: float, time_on: float, update_rate: int) -> tuple:
+	"""Compress an envelope table to the samples where the duty cycle changes.
+
+	Returns
+	-------
+	steps: tuple
+		(offset in seconds, duty cycle) pairs, Ex. the square signal is a single step ((0.0, 255),).
+	"""
+
+	steps = []
+	previous_value = None
+	for sample, signal_value in enumerate(_envelope(signal_type, power, time_on, update_rate)):
+		if signal_value != previous_value:
+			steps.append((sample/update_rate, signal_value))
+			previous_value = signal_value
+
+	return tuple(steps)
+
+# Braille table, each letter is a 6 bit mask where bit 0 is the dot 1 and bit 5 the dot 6, Ex. "c" -> 0b001001 (dots 1 and 4)
+_REGULAR_ALPHABET = " abcdefghijklmnñopqrstuvwxyz"
+_BRAILLE_ALPHABET = [[0,0,0,0,0,0],[1,0,0,0,0,0],[1,1,0,0,0,0],[1,0,0,1,0,0],[1,0,0,1,1,0],[1,0,0,0,1,0],[1,1,0,1,0,0],[1,1,0,1,1,0],[1,1,0,0,1,0],[0,1,0,1,0,0],[0,1,0,1,1,0],[1,0,1,0,0,0],[1,1,1,0,0,0],[1,0,1,1,0,0],[1,0,1,1,1,0],[1,1,0,1,1,1],[1,0,1,0,1,0],[1,1,1,1,0,0],[1,1,1,1,1,0],[1,1,1,0,1,0],[0,1,1,1,0,0],[0,1,1,1,1,0],[1,0,1,0,0,1],[1,1,1,0,0,1],[0,1,0,1,1,1],[1,0,1,1,0,1],[1,0,1,1,1,1],[1,0,1,0,1,1]]
+BRAILLE_MASKS = {letter: sum(dot << index for index, dot in enumerate(pattern)) for letter, pattern in zip(_REGULAR_ALPHABET, _BRAILLE_ALPHABET)}
+
+# Dot pattern of every mask, Ex. BRAILLE_PATTERNS[0b001001] -> (1, 0, 0, 1, 0, 0)
+BRAILLE_PATTERNS = tuple(tuple((mask >> dot) & 1 for dot in range(6)) for mask in range(64))
+
+class _TranslationTable(dict):
+	"""str.translate table from a character to chr(braille mask), the characters out of the table are deleted."""
+
+	def __missing__(self, code: int):
+		return None
+
+def _translation_table() -> _TranslationTable:
+	"""Map every latin character to its braille mask, upper case and accents are folded, Ex. "Á" -> "a", "ü" -> "u" but "ñ" stays."""
+
+	table = _TranslationTable()
+	for code in range(0x250):
+		letter = chr(code).lower()
+		if letter != "ñ":
+			letter = unicodedata.normalize('NFD', letter).encode('ascii', 'ignore').decode("utf-8")
+		if letter in BRAILLE_MASKS and (chr(code).isalpha() or chr(code) == " "):
+			table[code] = chr(BRAILLE_MASKS[letter])
+
+	return table
+
+_TRANSLATION_TABLE = _translation_table()
+
+def translate(text: str) -> bytes:
+	"""Translate a text to braille masks in one pass, the characters out of the braille alphabet are skipped.
+
+	Parameters
+	----------
+	text : str
+		Text to be translated, Ex. "Hola Ñandú!"
+
+	Returns
+	-------
+	braille_text: bytes
+		One 6 bit braille mask per translated character, Ex. b'\x13\x15\x07\x01\x00;\x01\x1d\x19%'
+	"""
+
+	return text.translate(_TRANSLATION_TABLE).encode("ascii")
+
+# Letter of every braille mask and str.translate table folding case and accents, the rest of characters are kept
+_MASK_LETTERS = {mask: letter for letter, mask in BRAILLE_MASKS.items()}
+_FOLD_TABLE = {code: _MASK_LETTERS[ord(mask)] for code, mask in _TRANSLATION_TABLE.items() if _MASK_LETTERS[ord(mask)] != chr(code)}
+
+def fold(text: str) -> str:
+	"""Lower case and remove the accents of a text like translate does, Ex. "¿Qué Ñandú?" -> "¿que ñandu?"
+
+	Parameters
+	----------
+	text : str
+		Text to be folded.
+
+	Returns
+	-------
+	folded_text: str
+		Text with the same length, the characters out of the braille alphabet are kept.
+	"""
+
+	return text.translate(_FOLD_TABLE)
+
+class _StreamTranslator:
+	"""Translate a text that arrives in chunks, the braille masks of each chunk are available as soon as it arrives.
+
+	With a contractor the last word of a chunk is held back until the word ends, the contractions depend on the whole word.
+	"""
+
+	def __init__(self, translator):
+		self.translator = translator
+		self.contracted = translator is not translate
+		self.pending = ""
+
+	def feed(self, chunk: str) -> bytes:
+		if not self.contracted:
+			return self.translator(chunk)
+
+		self.pending += chunk
+		word_start = len(self.pending)
+		while word_start > 0 and self.pending[word_start-1].isalpha():
+			word_start -= 1
+
+		braille_text = self.translator(self.pending[:word_start])
+		self.pending = self.pending[word_start:]
+		return braille_text
+
+	def flush(self) -> bytes:
+		braille_text = self.translator(self.pending)
+		self.pending = ""
+		return braille_text
+
+def _with_next(braille_text: Union[bytes, Iterator[int]]) -> Iterator[tuple]:
+	"""Pair each braille mask with the following one, the last mask and the masks of text streams are paired with None."""
+
+	if isinstance(braille_text, (bytes, bytearray)):
+		return zip(braille_text, list(braille_text[1:]) + [None])
+	return ((braille_mask, None) for braille_mask in braille_text)
+
+class Playback:
+	"""Handle of a pattern or text queued in the braille cell background player.
+
+	Attributes
+	-------
+	braille_text: bytes, iterator
+		Braille masks to be played, an iterator when a text stream is written.
+
+	total: int
+		Number of masks to be played, None for text streams.
+
+	parameters: tuple
+		(power, time_on, time_off, signal_type) when the playback was queued.
+
+	played: int
+		Number of masks played to the end, a mask cut short by cancel is not counted.
+
+	Methods
+	-------
+	wait
+		Wait until the playback finishes.
+
+	cancel
+		Stop the playback, the current letter is interrupted.
+
+	progress
+		Fraction of the masks already played.
+	"""
+
+	def __init__(self, braille_text: Union[bytes, Iterator[int]], parameters: tuple):
+		self.braille_text = braille_text
+		self.total = len(braille_text) if isinstance(braille_text, (bytes, bytearray)) else None
+		self.parameters = parameters
+		self.played = 0
+		self._cancel = threading.Event()
+		self._done = threading.Event()
+
+	def __repr__(self):
+		return f"Playback({self.played}/{self.total}, done={self.done()})"
+
+	def wait(self, timeout: float=None) -> bool:
+		"""Wait until the playback finishes, returns False if the timeout expired first."""
+		return self._done.wait(timeout)
+
+	def cancel(self):
+		"""Stop the playback, the current letter is interrupted and the rest are skipped."""
+		self._cancel.set()
+
+	def cancelled(self) -> bool:
+		return self._cancel.is_set()
+
+	def done(self) -> bool:
+		return self._done.is_set()
+
+	def progress(self) -> float:
+		"""Fraction of the masks already played, from 0 to 1, None for text streams until they finish."""
+		if self.total is None:
+			return 1.0 if self.done() else None
+		return self.played/self.total if self.total else 1.0
+
 
 class NewCell:
 	"""Control a braille cell through pwm signals in the gpio ports (BCM)
@@ -14,6 +293,7 @@ class NewCell:
 	-------
 	braille_pins: dict
 		Dictionary with the BCM pins used to control the dots in the braille cell, by default {"signal_pin":18, "d1": 4, "d2": 17, "d3": 27, "d4": 22, "d5": 23, "d6": 24}
+		Only signal_pin is driven with pwm, the dot pins are switched together through the gpio bank 1 (BCM 0 to 31).
 	
 	power: int(1 to 5)
 		Integer indicating in a scall from 1 to 5 the braille cell vibration power, by default 5
@@ -35,13 +315,41 @@ class NewCell:
 			7 - Click signal (logarithmic + exponential)
 			8 - Reverse click signal (exponential + logarithmic)
 
+	update_rate: int
+		Envelope samples per second written to the signal pin, by default 100
+
+	playback: str
+		How the envelope is played, by default "software"
+			software - Python writes each duty cycle to the signal pin
+			wave - The whole letter is compiled into a pigpio waveform played by the daemon DMA engine,
+				the letters pigpio can't play are played with software, after _WAVE_MAX_FAILURES failed
+				letters in a row the cell switches to software
+
+	queue_size: int
+		Playbacks the background player can hold, by default 8. Non blocking trigger and writer calls wait
+		while the queue is full.
+
+	contractor: braille_contractions.Contractor
+		Contracted braille translator used by writer, by default None (uncontracted braille).
+
+	gapless: bool
+		Keep the dots active between letters, by default False. The next letter dots are staged when the signal
+		stops and only the dots that change are written, the cell is switched off after the last letter.
+
+	stats: bool
+		Count the gpio session calls and the letters played by the cell, by default False. The session is wrapped
+		in a hardware.InstrumentedPi shared by every cell, read the counters with the stats method.
+
 	Methods
 	-------
 	init
 		Initialize all the pins.
 	
+	use_backend
+		Drive every braille cell through a gpio session.
+
 	close
-		Stop pigpio session.
+		Stop the gpio session.
 		
 	pinout
 		Assign and initialize the braille cell bcm gpio pins.
@@ -58,38 +366,102 @@ class NewCell:
 	generator
 		Activate each dot in the braille cell consecutively.
 
+	trigger_async, writer_async, generator_async
+		Asyncio versions of trigger, writer and generator to play the cell as a task of an event loop.
+
 	random_letter
 		Write a random letter in the braille cell.
 
 	random_pattern
 		Generate a random braille pattern and activate it in the braille cell.
+
+	stats
+		Snapshot of the gpio calls and the envelope rates of the played letters.
 	"""
 
-	def __init__(self, braille_pins: dict={"signal_pin":18, "d1": 22, "d2": 23, "d3": 24, "d4": 27, "d5": 4, "d6": 17}, power: int=5, time_on: float=3, time_off: float=1, signal_type: int=1):
+	__slots__ = ("_braille_pins", "_signal_pin", "_dot_pins", "_dot_banks", "power", "time_on", "time_off", "signal_type", "update_rate", "playback", "contractor", "gapless", "_dots", "_wave_failures", "_queue", "_player", "_lock", "_stats")
+
+	def __init__(self, braille_pins: dict={"signal_pin":18, "d1": 22, "d2": 23, "d3": 24, "d4": 27, "d5": 4, "d6": 17}, power: int=5, time_on: float=3, time_off: float=1, signal_type: int=1, update_rate: int=100, playback: str="software", queue_size: int=8, contractor=None, gapless: bool=False, stats: bool=False):
 		self.braille_pins = braille_pins
 		self.power = power
 		self.time_on = time_on
 		self.time_off = time_off
 		self.signal_type = signal_type
+		self.update_rate = update_rate
+		self.playback = playback
+		self.contractor = contractor
+		self.gapless = gapless
+		self._dots = None		# Mask of the dots currently active, None until the pins are initialized
+		self._wave_failures = 0		# Letters in a row the waveform playback failed
+
+		# Background player, started by the first non blocking trigger or writer
+		self._queue = queue.Queue(maxsize=queue_size)
+		self._player = None
+		self._lock = threading.RLock()
+
+		if NewCell.pi is None:
+			NewCell.pi = hardware.gpio()
+
+		# Signal type -> [letters, gpio calls, signal updates, loop iterations, seconds on], None when the stats are disabled
+		self._stats = None
+		if stats:
+			self._stats = {}
+			if not isinstance(NewCell.pi, hardware.InstrumentedPi):
+				NewCell.pi = hardware.InstrumentedPi(NewCell.pi)
 
 	def __repr__(self):
-		return f"NewCell({self.braille_pins}, {self.power}, {self.time_on}, {self.time_off}, {self.signal_type})"
+		return f"NewCell({self.braille_pins}, {self.power}, {self.time_on}, {self.time_off}, {self.signal_type}, {self.update_rate}, {self.playback!r})"
 
 	def __str__(self):
 		return f"Braille Cell\npins: {self.braille_pins}\npower: {self.power}\nActive time: {self.time_on}\nTime between pulses: {self.time_off}\nSignal type: {self.signal_type}\n"
 	
-	# GPIO setup
-	pi = GPIO.pi()
+	# GPIO setup, the session is opened by the first cell or set with use_backend
+	pi = None
+	_waves = {}
+	_wave_pins = set()
+
+	@property
+	def braille_pins(self) -> dict:
+		return self._braille_pins
+
+	@braille_pins.setter
+	def braille_pins(self, braille_pins: dict):
+		self._braille_pins = dict(braille_pins)
+		self._signal_pin = self._braille_pins["signal_pin"]
+		self._dot_pins = tuple(self._braille_pins[f"d{dot}"] for dot in range(1, 7))
+		# gpio bank 1 bits of the dot pins of every braille mask, the dots are written at once with set_bank_1/clear_bank_1
+		self._dot_banks = tuple(sum(1 << pin for dot, pin in enumerate(self._dot_pins) if (braille_mask >> dot) & 1) for braille_mask in range(64))
 
 	def init(self):
 		"""Initialize all the pins."""
 		for pin in self.braille_pins.values():
-			NewCell.pi.set_mode(pin, GPIO.OUTPUT)
+			NewCell.pi.set_mode(pin, hardware.OUTPUT)
 			NewCell.pi.write(pin, 0)
+		self._dots = 0
+
+	@classmethod
+	def use_backend(cls, pi):
+		"""Drive every braille cell through a gpio session, Ex. NewCell.use_backend(hardware.FakePi()).
+
+		Parameters
+		----------
+		pi : pigpio.pi or hardware.FakePi
+			Gpio session, it is instrumented too if the current session is.
+		"""
+
+		if isinstance(cls.pi, hardware.InstrumentedPi) and not isinstance(pi, hardware.InstrumentedPi):
+			pi = hardware.InstrumentedPi(pi)
+		cls.pi = pi
+		cls._waves.clear()
+		cls._wave_pins.clear()
 
 	@classmethod
 	def close(cls):
-		"""Stop pigpio session."""
+		"""Stop the gpio session."""
+		if cls._waves:
+			cls.pi.wave_clear()
+			cls._waves.clear()
+		cls._wave_pins.clear()
 		cls.pi.stop()
 
 	def pinout(self, signal_pin: int=None, d1: int=None, d2: int=None, d3: int=None, d4: int=None, d5: int=None, d6: int=None) -> dict:
@@ -108,14 +480,18 @@ class NewCell:
 			Pinout dictionary, Ex. {"signal_pin":18, "d1":4, "d2":17, "d3":27, "d4":22, "d5":23, "d6":24}.
 		"""
 		function_arguments = locals()
+		braille_pins = self.braille_pins
 
 		for key, value in function_arguments.items():
-			if key != "self" and isinstance(value, int):
-				self.braille_pins[key] = value
+			if key not in ("self", "braille_pins") and isinstance(value, int):
+				braille_pins[key] = value
+
+		self.braille_pins = braille_pins
 
 		for _, pin in self.braille_pins.items():
-			NewCell.pi.set_mode(pin, GPIO.OUTPUT)
+			NewCell.pi.set_mode(pin, hardware.OUTPUT)
 			NewCell.pi.write(pin, 0)
+		self._dots = 0
 
 		print(f"\nPinout\n{self.braille_pins}\n")
 
@@ -189,433 +565,588 @@ class NewCell:
 		else:
 			return value
 
-	def _signal_square(self, braille_pattern: list) -> int:
-		"""Activate a braille pattern with a square signal for time_on seconds and then waits for time_off seconds.
+	def _parameters(self) -> tuple:
+		"""Snapshot of the signal parameters used to play a pattern, (power, time_on, time_off, signal_type)."""
+		return (self.power, self.time_on, self.time_off, self.signal_type)
+
+	def _play(self, braille_mask: int, parameters: tuple, cancel: threading.Event=None, next_mask: int=None):
+		"""Activate a braille pattern replaying an envelope for time_on seconds and then waits for time_off seconds.
 
 		Parameters
 		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+		braille_mask : int
+			6 bit braille pattern, bit 0 is the dot 1 and bit 5 the dot 6.
+
+		parameters : tuple
+			(power, time_on, time_off, signal_type) used to play the pattern.
+
+		cancel : threading.Event, optional
+			When set the envelope stops and the cell is switched off, by default None.
+
+		next_mask : int, optional
+			Braille mask of the following letter, staged during time_off in gapless mode, by default None.
 
 		Returns
 		-------
-		signal_value: int
-
+		played: tuple
+			(signal updates, loop iterations, seconds the signal was on) of the letter.
 		"""
 
-		signal_value=255*(self.power/5.0)
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
-			
-		time.sleep(self.time_on)
-		
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
-		
-		time.sleep(self.time_off)
+		power, time_on, time_off, signal_type = parameters
+		steps = _envelope_steps(signal_type, power, time_on, self.update_rate)
+		sleep = time.sleep if cancel is None else cancel.wait
+
+		signal_pin = self._signal_pin
+		self._set_dots(braille_mask)
+
+		updates = 0
+		t_ini = time.perf_counter()
+		for offset, signal_value in steps:
+			delay = t_ini + offset - time.perf_counter()
+			if delay > 0 and sleep(delay):
+				break
+			NewCell.pi.set_PWM_dutycycle(signal_pin, signal_value)
+			updates += 1
+		else:
+			delay = t_ini + time_on - time.perf_counter()
+			if delay > 0:
+				sleep(delay)
 
-		return signal_value
+		on_time = time.perf_counter() - t_ini
+		self._signal_off(next_mask)
+		sleep(time_off)
+		return updates, updates, on_time
 
-	def _signal_triangle(self, braille_pattern: list) -> list:
-		"""Activate a braille pattern with a triangle signal for time_on seconds and then waits for time_off seconds.
+	async def _play_async(self, braille_mask: int, parameters: tuple, next_mask: int=None):
+		"""Asyncio version of _play, the envelope deadlines are awaited instead of slept."""
 
-		Parameters
-		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+		power, time_on, time_off, signal_type = parameters
+		steps = _envelope_steps(signal_type, power, time_on, self.update_rate)
 
-		Returns
-		-------
-		signal: list
-			List with the values the signal takes over time.
-		"""
+		signal_pin = self._signal_pin
+		self._set_dots(braille_mask)
 
-		signal = []
-		t_ini = time.time()
-		
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
+		try:
+			t_ini = time.perf_counter()
+			for offset, signal_value in steps:
+				await _sleep_until(t_ini + offset)
+				NewCell.pi.set_PWM_dutycycle(signal_pin, signal_value)
 
-		while time.time() <= (t_ini + self.time_on):
-			if time.time() < (t_ini + self.time_on/2.0):
-				signal_value = (255*(self.power/5.0))/(self.time_on/2.0)*(time.time()-t_ini)  
-				t_ini1 = time.time() 													
-			else:
-				signal_value = (255*(self.power/5.0))-(255*(self.power/5.0))/(self.time_on/2.0)*(time.time()-t_ini1)
-			
-			signal_value = NewCell._clamp(signal_value)
-			signal.append(signal_value)
-			NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-			
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
+			await _sleep_until(t_ini + time_on)
+		except asyncio.CancelledError:
+			self._switch_off()
+			raise
 
-		time.sleep(self.time_off)
+		on_time = time.perf_counter() - t_ini
+		self._signal_off(next_mask)
 
-		return signal
+		await _sleep_until(time.perf_counter() + time_off)
+		return len(steps), len(steps), on_time
 
-	def _signal_ramp(self, braille_pattern: list) -> list:
-		"""Activate a braille pattern with a ramp signal for time_on seconds and then waits for time_off seconds.
+	def _set_dots(self, braille_mask: int):
+		"""Activate the dot pins of a braille mask with one bank write per direction, only the dots that change are written."""
 
-		Parameters
-		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+		dots = 0b111111 & ~braille_mask if self._dots is None else self._dots
+		dots_off = self._dot_banks[dots & ~braille_mask]
+		dots_on = self._dot_banks[braille_mask & ~dots]
+		if dots_off:
+			NewCell.pi.clear_bank_1(dots_off)
+		if dots_on:
+			NewCell.pi.set_bank_1(dots_on)
+		self._dots = braille_mask
 
-		Returns
-		-------
-		signal: list
-			List with the values the signal takes over time.
-		"""
+	def _signal_off(self, next_mask: int=None):
+		"""End the activation signal, in gapless mode the dots stay active or are changed to the next letter."""
 
-		signal = []
-		t_ini = time.time()
-		
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
+		if not self.gapless:
+			self._switch_off()
+			return
 
-		while time.time() <= (t_ini + self.time_on):
-			signal_value = (255*(self.power/5.0))/(self.time_on)*(time.time()-t_ini)
+		NewCell.pi.set_PWM_dutycycle(self._signal_pin, 0)
+		if next_mask is not None:
+			self._set_dots(next_mask)
 
-			signal_value = NewCell._clamp(signal_value)
-			signal.append(signal_value)
-			NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-					
+	def _switch_off(self):
+		"""Deactivate the signal pin and every dot pin."""
+		NewCell.pi.set_PWM_dutycycle(self._signal_pin, 0)
+		self._set_dots(0)
 
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
+	def _finish(self):
+		"""Deactivate the dots the gapless mode left active after the last letter."""
 
-		time.sleep(self.time_off)
+		if self.gapless and self._dots:
+			self._set_dots(0)
 
-		return signal
+	@classmethod
+	def _wave_ids(cls, waves: dict) -> dict:
+		"""Get the ids of the cached pigpio waveforms of a chain, creating the missing ones from their pulses.
 
-	def _signal_sine(self, braille_pattern: list) -> list:
-		"""Activate a braille pattern with a sine signal (positive side) for time_on seconds and then waits for time_off seconds.
+		If the missing waveforms don't fit in the cache it is cleared before creating any of them, never while the
+		chain is being built, pigpio reuses the ids after wave_clear and the ids already taken would be stale.
 
 		Parameters
 		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+		waves : dict
+			Cache key describing each waveform -> list(pigpio.pulse) that make it.
 
 		Returns
 		-------
-		signal: list
-			List with the values the signal takes over time.
+		wave_ids: dict
+			Cache key -> pigpio waveform id.
 		"""
 
-		signal = []
-		t_ini = time.time()
-		
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
-		
-		while time.time() <= (t_ini + self.time_on):
-			signal_value = (255*(self.power/5.0))*math.sin((math.pi/self.time_on)*(time.time()-t_ini))
-			
-			signal_value = NewCell._clamp(signal_value)
-			signal.append(signal_value)
-			NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
+		missing = [key for key in waves if key not in cls._waves]
+		if len(cls._waves) + len(missing) > _WAVE_MAX_IDS:
+			cls.pi.wave_clear()
+			cls._waves.clear()
+			missing = list(waves)
+
+		for key in missing:
+			cls.pi.wave_add_generic(waves[key])
+			cls._waves[key] = cls.pi.wave_create()
 
-		time.sleep(self.time_off)
+		return {key: cls._waves[key] for key in waves}
+
+	@classmethod
+	def _reset_waves(cls):
+		"""Delete the cached waveforms, their ids can't be trusted after a pigpio error."""
+
+		cls._waves.clear()
+		try:
+			cls.pi.wave_clear()
+		except hardware.error:
+			pass
+
+	def _wave_failed(self, error: Exception):
+		"""Count a failed waveform letter, the cell switches to software playback after _WAVE_MAX_FAILURES in a row."""
+
+		NewCell._reset_waves()
+		self._wave_failures += 1
+		if self._wave_failures >= _WAVE_MAX_FAILURES:
+			print(f"ERROR: pigpio waveform playback failed ({error}) {self._wave_failures} letters in a row, switching to software playback")
+			self.playback = "software"
+			self._wave_failures = 0
+		else:
+			print(f"ERROR: pigpio waveform playback failed ({error}), the letter is played with software")
 
-		return signal
+	def _play_wave(self, braille_mask: int, parameters: tuple, cancel: threading.Event=None, next_mask: int=None):
+		"""Activate a braille pattern with a pigpio waveform for time_on seconds and then waits for time_off seconds.
 
-	def _signal_log(self, braille_pattern: list) -> list:
-		"""Activate a braille pattern with a logarithmic signal for time_on seconds and then waits for time_off seconds.
+		The dot pattern and the envelope are compiled into a wave chain, the envelope is resampled so the chain
+		has at most _WAVE_MAX_SEGMENTS segments and each segment repeats a single pwm cycle wave.
 
 		Parameters
 		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+		braille_mask : int
+			6 bit braille pattern, bit 0 is the dot 1 and bit 5 the dot 6.
+
+		parameters : tuple
+			(power, time_on, time_off, signal_type) used to play the pattern.
+
+		cancel : threading.Event, optional
+			When set the waveform is stopped and the cell is switched off, by default None.
+
+		next_mask : int, optional
+			Braille mask of the following letter, staged by the waveform end in gapless mode, by default None.
 
 		Returns
 		-------
-		signal: list
-			List with the values the signal takes over time.
+		played: tuple
+			(envelope segments, wave_tx_busy polls, seconds the waveform was transmitting) of the letter.
 		"""
 
-		signal = []
-		t_ini = time.time()
-
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
+		power, time_on, time_off, signal_type = parameters
+		sleep = time.sleep if cancel is None else cancel.wait
+
+		t_ini = time.perf_counter()
+		segments = self._send_wave(braille_mask, parameters, next_mask)
+
+		polls = 1
+		if sleep(time_on):
+			self._stop_wave()
+		while NewCell.pi.wave_tx_busy():
+			time.sleep(0.005)
+			polls += 1
+
+		on_time = time.perf_counter() - t_ini
+		sleep(time_off)
+		return segments, polls, on_time
+
+	async def _play_wave_async(self, braille_mask: int, parameters: tuple, next_mask: int=None):
+		"""Asyncio version of _play_wave, the waveform end is awaited instead of slept."""
+
+		power, time_on, time_off, signal_type = parameters
+		t_ini = time.perf_counter()
+		segments = self._send_wave(braille_mask, parameters, next_mask)
+
+		polls = 1
+		try:
+			await asyncio.sleep(time_on)
+			while NewCell.pi.wave_tx_busy():
+				await asyncio.sleep(0.005)
+				polls += 1
+		except asyncio.CancelledError:
+			self._stop_wave()
+			raise
+
+		on_time = time.perf_counter() - t_ini
+		await _sleep_until(time.perf_counter() + time_off)
+		return segments, polls, on_time
+
+	def _stop_wave(self):
+		"""Stop the waveform being transmitted and deactivate the cell pins."""
+		NewCell.pi.wave_tx_stop()
+		NewCell.pi.clear_bank_1((1 << self._signal_pin) | self._dot_banks[0b111111])
+		self._dots = 0
+
+	def _send_wave(self, braille_mask: int, parameters: tuple, next_mask: int=None):
+		"""Compile a braille mask and its envelope into a pigpio wave chain and start transmitting it, returns the envelope segments, see _play_wave."""
+
+		power, time_on, time_off, signal_type = parameters
+		signal_pin = self._signal_pin
+		signal_mask = 1 << signal_pin
+		dots_on = self._dot_banks[braille_mask]
+		dots_off = self._dot_banks[0b111111 & ~braille_mask]
+
+		# Hardware pwm would keep overwriting the signal pin driven by the waveform
+		if signal_pin not in NewCell._wave_pins:
+			NewCell.pi.write(signal_pin, 0)
+			NewCell._wave_pins.add(signal_pin)
+
+		wave_rate = max(1, min(self.update_rate, int(_WAVE_MAX_SEGMENTS/time_on)))
+		steps = _envelope_steps(signal_type, power, time_on, wave_rate)
+
+		# (cache key, pwm cycles) of each envelope segment, the waveforms are created once the whole chain is known
+		dots_key = ("dots", dots_on, dots_off)
+		waves = {dots_key: [hardware.pulse(dots_on, dots_off, 1)]}
+		segments = []
+		for index, (offset, signal_value) in enumerate(steps):
+			end = steps[index+1][0] if index+1 < len(steps) else time_on
+			cycles = min(65535, round((end - offset)*1e6/_WAVE_PWM_PERIOD_US))
+			if cycles == 0:
 				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
-	
-		while time.time() <= (t_ini + self.time_on):
-			if time.time() < (t_ini + self.time_on/2.0):
-				t_current = (2*(10-1)/(self.time_on))*(time.time() - t_ini) + 1 	
-				t_ini1 = time.time()
-				
-			else:				
-				t_current = (2*(1-10)/(self.time_on))*(time.time() - t_ini1) + 10
-					
-			signal_value = (255.0*math.log10(t_current))*(self.power/5.0)
-			
-			signal_value = NewCell._clamp(signal_value)
-			signal.append(signal_value)
-			NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-			
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
 
-		time.sleep(self.time_off)
+			on_us = round(_WAVE_PWM_PERIOD_US*signal_value/255)
+			if on_us == 0:
+				pulses = [hardware.pulse(0, signal_mask, _WAVE_PWM_PERIOD_US)]
+			elif on_us == _WAVE_PWM_PERIOD_US:
+				pulses = [hardware.pulse(signal_mask, 0, _WAVE_PWM_PERIOD_US)]
+			else:
+				pulses = [hardware.pulse(signal_mask, 0, on_us), hardware.pulse(0, signal_mask, _WAVE_PWM_PERIOD_US - on_us)]
+
+			key = ("pwm", signal_pin, on_us)
+			waves[key] = pulses
+			segments.append((key, cycles))
+
+		if not self.gapless:
+			off_on, off_off = 0, signal_mask | dots_on | dots_off
+			dots = 0
+		elif next_mask is None:
+			off_on, off_off = 0, signal_mask
+			dots = braille_mask
+		else:
+			off_on, off_off = self._dot_banks[next_mask], signal_mask | self._dot_banks[0b111111 & ~next_mask]
+			dots = next_mask
+
+		off_key = ("off", off_on, off_off)
+		waves[off_key] = [hardware.pulse(off_on, off_off, 1)]
+
+		wave_ids = NewCell._wave_ids(waves)
+		chain = [wave_ids[dots_key]]
+		for key, cycles in segments:
+			chain += [255, 0, wave_ids[key], 255, 1, cycles & 0xFF, cycles >> 8]
+		chain.append(wave_ids[off_key])
+		NewCell.pi.wave_chain(chain)
 
-		return signal
+		# The dots left active are only known once pigpio took the chain, a failed letter is replayed with software
+		self._dots = dots
+		return len(segments)
 
-	def _signal_exp(self, braille_pattern: list) -> list:
-		"""Activate a braille pattern with a exponential signal for time_on seconds and then waits for time_off seconds.
+	@staticmethod
+	def _translator(letter: str) -> list:
+		"""Translate a letter to a braille dot pattern, Ex. "a" -> [1, 0, 0, 0, 0, 0], " " -> [0, 0, 0, 0, 0, 0]
 
 		Parameters
 		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+		letter : str
+			Input letter to be translated.
 
 		Returns
 		-------
-		signal: list
-			List with the values the signal takes over time.
+		braille_letter: list
+			6-value boolean list representing  the input letter
 		"""
 
-		signal = []
-		t_ini = time.time()
-		
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
-		
-		while time.time() <= (t_ini + self.time_on):
-			if time.time() < (t_ini + self.time_on/2.0):
-				t_current = (2*(math.log(10)-(-math.log(10)))/(self.time_on))*(time.time() - t_ini) + (-math.log(10)) 
-				t_ini1 = time.time()
-				
-			else:
-				# Second half of the cycle, t_current is calculated from time_on/2 to time_on
-				
-				t_current = (2*((-math.log(10))-math.log(10))/(self.time_on))*(time.time() - t_ini1) + math.log(10) # In this line we remap the time so that is goes from ln(10) to -ln(10)
-					
-					
-			signal_value = (25.5*math.exp(t_current))*(self.power/5.0)
-			
-			signal_value = NewCell._clamp(signal_value)
-			signal.append(signal_value)
-			NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-			
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
+		braille_letter = translate(letter)
+		if len(braille_letter) != 1:
+			raise KeyError(letter)
+
+		return list(BRAILLE_PATTERNS[braille_letter[0]])
+
+	def _translate(self, text: str) -> bytes:
+		"""Translate a text to braille masks, contracted if the cell has a contractor."""
+		if self.contractor is None:
+			return translate(text)
+		return self.contractor.translate(text)
+
+	def _stream(self, text: Union[str, Iterable[str]]) -> Iterator[int]:
+		"""Translate a text or a stream of text chunks, yielding each braille mask as soon as its chunk arrives."""
+
+		if isinstance(text, str):
+			yield from self._translate(text)
+			return
 
-		time.sleep(self.time_off)
+		stream_translator = _StreamTranslator(translate if self.contractor is None else self.contractor.translate)
+		for chunk in text:
+			yield from stream_translator.feed(chunk)
+		yield from stream_translator.flush()
 
-		return signal
+	async def _stream_async(self, text: Union[str, Iterable[str], AsyncIterable[str]]) -> AsyncIterator[int]:
+		"""Asyncio version of _stream, the text chunks can also come from an async iterator."""
 
-	def _signal_click(self, braille_pattern: list) -> list:
-		"""Activate a braille pattern with a click signal (first half logarithmic, second half exponential) for time_on seconds and then waits for time_off seconds.
+		if not hasattr(text, "__aiter__"):
+			for braille_mask in self._stream(text):
+				yield braille_mask
+			return
+
+		stream_translator = _StreamTranslator(translate if self.contractor is None else self.contractor.translate)
+		async for chunk in text:
+			for braille_mask in stream_translator.feed(chunk):
+				yield braille_mask
+		for braille_mask in stream_translator.flush():
+			yield braille_mask
+
+	@staticmethod
+	def _mask(dot_pattern: Union[int, bytes, list]) -> int:
+		"""Pack a braille pattern into its 6 bit mask, Ex. [1, 0, 1, 1, 0, 0] -> 0b001101, b"\\x0d" -> 0b001101
 
 		Parameters
 		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+		dot_pattern : int, bytes, list
+			6 bit mask, single byte holding the mask or 6-value boolean list.
 
 		Returns
 		-------
-		signal: list
-			List with the values the signal takes over time.
+		braille_mask: int
+			6 bit braille pattern, bit 0 is the dot 1 and bit 5 the dot 6.
 		"""
-		
-		signal = []
-		t_ini = time.time()
-		
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
-		
-		while time.time() <= (t_ini + self.time_on):
-			
-			if time.time() < (t_ini + self.time_on/2.0):				
-				t_current = (2*(10-1)/(self.time_on))*(time.time() - t_ini) + 1 
-				signal_value = (255.0*math.log10(t_current))*(self.power/5.0)
-				t_ini1 = time.time()
-				
-			else:				
-				t_current = (2*((-math.log(10))-math.log(10))/(self.time_on))*(time.time() - t_ini1) + math.log(10) # In this line we remap the time so that is goes from -ln(10) to ln(10)
-				signal_value = (25.5*math.exp(t_current))*(self.power/5.0)
-					
-			signal_value = NewCell._clamp(signal_value)
-			signal.append(signal_value)
-			NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-			
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
 
-		time.sleep(self.time_off)
+		if isinstance(dot_pattern, int):
+			braille_mask = dot_pattern
+		elif isinstance(dot_pattern, (bytes, bytearray)):
+			braille_mask = dot_pattern[0]
+		else:
+			braille_mask = sum(1 << dot for dot, value in enumerate(dot_pattern) if value)
 
-		return signal
+		if not 0 <= braille_mask < 64:
+			raise ValueError(f"{dot_pattern} is not a 6 dot braille pattern")
 
-	def _signal_revclick(self, braille_pattern: list) -> list:
-		"""Activate a braille pattern with a click signal (first half exponential, second half logarithmic) for time_on seconds and then waits for time_off seconds.
+		return braille_mask
 
-		Parameters
-		----------
-		braille_pattern : list(bool)
-			6-value braille pattern list, 1 means the braille dot is activated and 0 means it isn't.
+	def _activate(self, braille_mask: int, parameters: tuple, cancel: threading.Event=None, next_mask: int=None):
+		"""Play a braille mask with the selected playback, see trigger."""
+
+		if parameters[3] not in _SIGNAL_SHAPES:
+			print("ERROR: Wrong signal selector")
+			return
+
+		calls = NewCell.pi.calls if self._stats is not None else 0
+		played = None
+		if self.playback == "wave":
+			try:
+				played = self._play_wave(braille_mask, parameters, cancel, next_mask)
+				self._wave_failures = 0
+			except hardware.error as error:
+				self._wave_failed(error)
+
+		if played is None:
+			played = self._play(braille_mask, parameters, cancel, next_mask)
+
+		if self._stats is not None:
+			self._record(parameters[3], NewCell.pi.calls - calls, played)
+
+	def _record(self, signal_type: int, calls: int, played: tuple):
+		"""Add a played letter to the stats of its signal type, played is the tuple returned by _play or _play_wave."""
+
+		signal_stats = self._stats.get(signal_type)
+		if signal_stats is None:
+			signal_stats = self._stats[signal_type] = [0, 0, 0, 0, 0.0]
+		updates, iterations, on_time = played
+		signal_stats[0] += 1
+		signal_stats[1] += calls
+		signal_stats[2] += updates
+		signal_stats[3] += iterations
+		signal_stats[4] += on_time
+
+	def _enqueue(self, braille_text: Union[bytes, Iterator[int]]):
+		"""Queue braille masks in the background player, starting it the first time.
 
 		Returns
 		-------
-		signal: list
-			List with the values the signal takes over time.
+		playback: Playback
+			Handle of the queued masks.
 		"""
 
-		signal = []
-		t_ini = time.time()
-		
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 255*braille_pattern[index-1])
+		if self._player is None:
+			self._player = threading.Thread(target=self._player_loop, name="braille-player", daemon=True)
+			self._player.start()
+
+		playback = Playback(braille_text, self._parameters())
+		self._queue.put(playback)
+		return playback
+
+	def _player_loop(self):
+		"""Background player, plays the queued masks one playback at a time."""
+
+		while True:
+			playback = self._queue.get()
+			with self._lock:
+				try:
+					for braille_mask, next_mask in _with_next(playback.braille_text):
+						if playback.cancelled():
+							break
+						self._activate(braille_mask, playback.parameters, playback._cancel, next_mask)
+						# A letter cancel() cut short isn't played
+						if playback.cancelled():
+							break
+						playback.played += 1
+				except Exception as error:
+					print(f"ERROR: braille playback failed ({error})")
+				finally:
+					self._finish()
+					playback._done.set()
+
+	def trigger(self, dot_pattern: Union[int, bytes, list], block: bool=True):
+		"""Activate the braille cell according to the cell parameters and the dot pattern
 		
-		while time.time() <= (t_ini + self.time_on):
-			if time.time() < (t_ini + self.time_on/2.0):
-				t_current = (2*(math.log(10)-(-math.log(10)))/(self.time_on))*(time.time() - t_ini) + (-math.log(10))
-				t_ini1 = time.time()
-				signal_value = (25.5*math.exp(t_current))*(self.power/5.0)
-			else:
-				t_current = (2*(1-10)/(self.time_on))*(time.time() - t_ini1) + 10
-				signal_value = (255.0*math.log10(t_current))*(self.power/5.0)
-					
-			signal_value = NewCell._clamp(signal_value)
-			signal.append(signal_value)
-			NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], signal_value)
-			
-		NewCell.pi.set_PWM_dutycycle(self.braille_pins["signal_pin"], 0)
-		for index, value in enumerate(self.braille_pins.values()):
-			if index == 0:
-				continue
-			NewCell.pi.set_PWM_dutycycle(value, 0)
+		Parameters
+		----------
+		dot_pattern : int, bytes, list
+			Braille pattern as a 6 bit mask (bit 0 is the dot 1), a single byte holding the mask or a boolean list
+			where 1 means active and zero means unactive, Ex. 0b001101, b"\\x0d" or [1, 0, 1, 1, 0, 0]
 
-		time.sleep(self.time_off)
+		block : bool, optional
+			Wait until the pattern is played, by default True. If False the pattern is queued in the background
+			player and a Playback handle is returned.
+		"""
 
-		return signal
-  
-	@staticmethod
-	def _translator(letter: str) -> list:
-		"""Translate a letter to a braille dot pattern, Ex. "a" -> [1, 0, 0, 0, 0, 0], " " -> [0, 0, 0, 0, 0, 0]
+		braille_mask = NewCell._mask(dot_pattern)
+		if not block:
+			return self._enqueue(bytes([braille_mask]))
+
+		with self._lock:
+			self._activate(braille_mask, self._parameters())
+			self._finish()
+
+	async def _activate_async(self, braille_mask: int, parameters: tuple, next_mask: int=None):
+		"""Asyncio version of _activate."""
+
+		if parameters[3] not in _SIGNAL_SHAPES:
+			print("ERROR: Wrong signal selector")
+			return
+
+		calls = NewCell.pi.calls if self._stats is not None else 0
+		played = None
+		if self.playback == "wave":
+			try:
+				played = await self._play_wave_async(braille_mask, parameters, next_mask)
+				self._wave_failures = 0
+			except hardware.error as error:
+				self._wave_failed(error)
+
+		if played is None:
+			played = await self._play_async(braille_mask, parameters, next_mask)
+
+		if self._stats is not None:
+			self._record(parameters[3], NewCell.pi.calls - calls, played)
+
+	async def trigger_async(self, dot_pattern: Union[int, bytes, list]):
+		"""Asyncio version of trigger, the other tasks of the event loop keep running while the pattern is played.
+
+		The asyncio methods don't wait for the background player, don't queue non blocking playbacks in the same cell.
 
 		Parameters
 		----------
-		letter : str
-			Input letter to be translated.
+		dot_pattern : int, bytes, list
+			Braille pattern, see trigger.
+		"""
 
-		Returns
-		-------
-		braille_letter: list
-			6-value boolean list representing  the input letter
+		try:
+			await self._activate_async(NewCell._mask(dot_pattern), self._parameters())
+		finally:
+			self._finish()
+
+	async def writer_async(self, text: Union[str, Iterable[str], AsyncIterable[str]]):
+		"""Asyncio version of writer, cancelling the task switches the cell off.
+
+		Parameters
+		----------
+		text : str, iterable, async iterable
+			String to be written in the braille cell or a stream of text chunks, see writer.
 		"""
 
-		letter = letter.lower()
-		if letter == "ñ":
-			clean_letter = "ñ"
-		else:
-			clean_letter = unicodedata.normalize('NFD', letter).encode('ascii', 'ignore').decode("utf-8")
+		parameters = self._parameters()
+		try:
+			if isinstance(text, str):
+				for caracter_braille, next_mask in _with_next(self._translate(text)):
+					await self._activate_async(caracter_braille, parameters, next_mask)
+			else:
+				async for caracter_braille in self._stream_async(text):
+					await self._activate_async(caracter_braille, parameters)
+		finally:
+			self._finish()
 
-		regular_alphabet = " abcdefghijklmnñopqrstuvwxyz"
-		braille_alphabet = [[0,0,0,0,0,0],[1,0,0,0,0,0],[1,1,0,0,0,0],[1,0,0,1,0,0],[1,0,0,1,1,0],[1,0,0,0,1,0],[1,1,0,1,0,0],[1,1,0,1,1,0],[1,1,0,0,1,0],[0,1,0,1,0,0],[0,1,0,1,1,0],[1,0,1,0,0,0],[1,1,1,0,0,0],[1,0,1,1,0,0],[1,0,1,1,1,0],[1,1,0,1,1,1],[1,0,1,0,1,0],[1,1,1,1,0,0],[1,1,1,1,1,0],[1,1,1,0,1,0],[0,1,1,1,0,0],[0,1,1,1,1,0],[1,0,1,0,0,1],[1,1,1,0,0,1],[0,1,0,1,1,1],[1,0,1,1,0,1],[1,0,1,1,1,1],[1,0,1,0,1,1]]
+	async def generator_async(self):
+		"""Asyncio version of generator."""
 
-		braille_dictionary = dict(zip(regular_alphabet, braille_alphabet))
-		return braille_dictionary[clean_letter]
+		parameters = self._parameters()
+		try:
+			for active_dot in range(6):
+				await self._activate_async(1 << active_dot, parameters, (1 << (active_dot + 1)) if active_dot < 5 else None)
+		finally:
+			self._finish()
+
+	def generator(self, block: bool=True):
+		"""Activate each dot in the braille cell consecutively.
 
-	def trigger(self, dot_pattern: list):
-		"""Activate the braille cell according to the cell parameters and the dot pattern
-		
 		Parameters
 		----------
-		dot_pattern : list
-			Boolean braille pattern where 1 means active and zero means unactive, Ex. [1, 0, 1, 1, 0, 0]
+		block : bool, optional
+			Wait until the dots are played, by default True. If False the dots are queued in the background
+			player and a Playback handle is returned.
 		"""
 
-		if self.signal_type == 1:
-			self._signal_square(dot_pattern)
-			
-		elif self.signal_type == 2:
-			self._signal_triangle(dot_pattern)
-			
-		elif self.signal_type == 3:
-			self._signal_ramp(dot_pattern)
-						
-		elif self.signal_type == 4:
-			self._signal_exp(dot_pattern)
-			
-		elif self.signal_type == 5:
-			self._signal_log(dot_pattern)
-			
-		elif self.signal_type == 6:
-			self._signal_sine(dot_pattern)			
-
-		elif self.signal_type == 7:			
-			self._signal_click(dot_pattern)
-
-		elif self.signal_type == 8:			
-			self._signal_revclick(dot_pattern)			
-		else:
-			print("ERROR: Wrong signal selector")
+		if not block:
+			return self._enqueue(bytes(1 << active_dot for active_dot in range(6)))
 
-	def generator(self):
-		"""Activate each dot in the braille cell consecutively."""
-		
 		for active_dot in range(6):
-			vector_generador = [0,0,0,0,0,0]
-			vector_generador[active_dot] = 1
-			self.trigger(vector_generador)
+			self.trigger(1 << active_dot)
 		
-	def writer(self, text: str):
+	def writer(self, text: Union[str, Iterable[str]], block: bool=True):
 		"""Write the text in the braille cell activating consecutively each alphanumer letter.
 
 		Parameters
 		----------
-		text : str
-			String to be written in the braille cell
+		text : str, iterable
+			String to be written in the braille cell or a stream of text chunks (Ex. a generator of ocr reads),
+			each chunk is translated and played as soon as it arrives.
+
+		block : bool, optional
+			Wait until the text is written, by default True. If False the text is queued in the background
+			player and a Playback handle is returned, a stream playback can only be cancelled between chunks.
 		"""
 		
-		for letter in text:
-			if letter.isalpha() or letter == " ":
-				caracter_braille = self._translator(letter)
-				self.trigger(caracter_braille)
-			else:
-				pass
+		braille_text = self._translate(text) if isinstance(text, str) else self._stream(text)
+		if not block:
+			return self._enqueue(braille_text)
+
+		with self._lock:
+			parameters = self._parameters()
+			try:
+				for caracter_braille, next_mask in _with_next(braille_text):
+					self._activate(caracter_braille, parameters, next_mask=next_mask)
+			finally:
+				self._finish()
 
 	def random_letter(self) -> str:
 		"""Write a random letter in the braille cell
@@ -628,19 +1159,65 @@ class NewCell:
 
 		alfabeto_regular = "abcdefghijklmnñopqrstuvwxyz"
 		letter = alfabeto_regular[random.randint(0,26)]
-		braille_letter = self._translator(letter)
+		braille_letter = BRAILLE_MASKS[letter]
 		self.trigger(braille_letter)
 
-		return [letter, braille_letter]
+		return [letter, list(BRAILLE_PATTERNS[braille_letter])]
 
 	def random_pattern(self) -> list:
 		"""Generate a random braille pattern and activate it in the braille cell."""
 		
-		vector_random = [0,0,0,0,0,0]
-		
-		for dot in range(6):
-			vector_random[dot] = random.randint(0,1)
-		
-		self.trigger(vector_random)
+		mask_random = random.getrandbits(6)
+		self.trigger(mask_random)
+
+		return list(BRAILLE_PATTERNS[mask_random])
+
+	def stats(self, reset: bool=False) -> dict:
+		"""Snapshot of the gpio calls and the envelope rates of the letters played since the stats were enabled.
+
+		The gpio calls are counted in the session shared by every cell, the calls per letter include the calls
+		other cells or threads made while the letter was playing.
+
+		Parameters
+		----------
+		reset : bool, optional
+			Start counting again after taking the snapshot, by default False.
+
+		Returns
+		-------
+		stats: dict
+			None if the cell was created with stats=False, otherwise
+			letters - letters played (each trigger plays one letter).
+			calls_per_letter - gpio calls per letter.
+			signals - per signal type, the letters, calls per letter, achieved signal updates per second (sample_rate)
+				and the loop iterations per letter of the playback (envelope steps or wave_tx_busy polls).
+			pigpio - per gpio method, the calls and the latency histogram, see hardware.InstrumentedPi.snapshot.
+		"""
 
-		return vector_random
\ No newline at end of file
+		if self._stats is None:
+			return None
+
+		signals = {}
+		for signal_type, (letters, calls, updates, iterations, on_time) in sorted(self._stats.items()):
+			signals[signal_type] = {
+				"letters": letters,
+				"calls_per_letter": calls/letters,
+				"sample_rate": updates/on_time if on_time else 0.0,
+				"iterations_per_letter": iterations/letters,
+				"on_time_per_letter": on_time/letters,
+			}
+
+		letters = sum(signal_stats[0] for signal_stats in self._stats.values())
+		calls = sum(signal_stats[1] for signal_stats in self._stats.values())
+		snapshot = {
+			"letters": letters,
+			"calls_per_letter": calls/letters if letters else 0.0,
+			"signals": signals,
+			"pigpio": NewCell.pi.snapshot(),
+		}
+
+		if reset:
+			self._stats.clear()
+			NewCell.pi.reset_stats()
+
+		return snapshot
\ No newline at end of file
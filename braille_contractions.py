@@ -0,0 +1,132 @@
+"""Contracted (grade 2) spanish braille, abbreviate common words and letter groups to write a text with fewer cells."""
+
+import brailfun
+
+# Whole words written with fewer cells, they are only contracted when the word stands alone, Ex. "que" but not "queso".
+# The single letter words of spanish (a, e, o, u, y) are never used as abbreviations.
+WORD_SIGNS = {
+    "bien": "b",
+    "como": "c",
+    "de": "d",
+    "fue": "f",
+    "gran": "g",
+    "hay": "h",
+    "lo": "l",
+    "muy": "m",
+    "no": "n",
+    "para": "p",
+    "que": "q",
+    "sobre": "s",
+    "tambien": "t",
+    "vez": "v",
+    "porque": "pq",
+    "cuando": "cd",
+    "siempre": "sp",
+    "mientras": "mt",
+    "nosotros": "ns",
+}
+
+# Letter groups written with one cell wherever they appear, as dot numbers, Ex. "ción" -> dots 1-4-6.
+# The cells are out of the alphabet, accented vowels and punctuation signs of spanish braille.
+GROUP_SIGNS = {
+    "cion": "146",
+    "mente": "156",
+    "ente": "1456",
+}
+
+def _dots_mask(dots: str) -> int:
+    """Braille mask of the dot numbers, Ex. "146" -> 0b101001."""
+    return sum(1 << (int(dot) - 1) for dot in dots)
+
+
+class Contractor:
+    """Translate text to contracted braille with a longest match over a trie of the abbreviations.
+
+    Attributes
+    -------
+    word_signs: dict
+        Whole words and the letters they are abbreviated to, by default WORD_SIGNS.
+
+    group_signs: dict
+        Letter groups and the dot numbers of the cell that replaces them, by default GROUP_SIGNS.
+
+    Methods
+    -------
+    translate
+        Translate a text to contracted braille masks.
+    """
+
+    def __init__(self, word_signs: dict=WORD_SIGNS, group_signs: dict=GROUP_SIGNS):
+        self.word_signs = word_signs
+        self.group_signs = group_signs
+
+        # Each trie node is a dict letter -> node, the "" key holds (braille masks, whole word only) of the contraction ending there
+        self._trie = {}
+        for word, letters in word_signs.items():
+            self._add(word, (brailfun.translate(letters), True))
+        for group, dots in group_signs.items():
+            self._add(group, (bytes([_dots_mask(dots)]), False))
+
+    def __repr__(self):
+        return f"Contractor({len(self.word_signs)} word signs, {len(self.group_signs)} group signs)"
+
+    def _add(self, text: str, contraction: tuple):
+        node = self._trie
+        for letter in brailfun.fold(text):
+            node = node.setdefault(letter, {})
+        node[""] = contraction
+
+    def _match(self, folded_text: str, start: int) -> tuple:
+        """Find the longest contraction starting at the start position.
+
+        Returns
+        -------
+        match: tuple
+            (end position, braille masks) of the contraction or None if there isn't any.
+        """
+
+        match = None
+        node = self._trie
+        position = start
+        while position < len(folded_text) and folded_text[position] in node:
+            node = node[folded_text[position]]
+            position += 1
+            if "" in node:
+                braille_text, whole_word = node[""]
+                if not whole_word or ((start == 0 or not folded_text[start-1].isalpha()) and (position == len(folded_text) or not folded_text[position].isalpha())):
+                    match = (position, braille_text)
+
+        return match
+
+    def translate(self, text: str) -> bytes:
+        """Translate a text to contracted braille masks, the characters out of the braille alphabet are skipped.
+
+        Parameters
+        ----------
+        text : str
+            Text to be translated, Ex. "Que bien"
+
+        Returns
+        -------
+        braille_text: bytes
+            One 6 bit braille mask per cell, Ex. b'\\x1f\\x00\\x03'
+        """
+
+        folded_text = brailfun.fold(text)
+        braille_text = bytearray()
+        position = 0
+        uncontracted = 0
+
+        while position < len(folded_text):
+            match = self._match(folded_text, position) if folded_text[position] in self._trie else None
+            if match is None:
+                position += 1
+                continue
+
+            braille_text += brailfun.translate(folded_text[uncontracted:position])
+            position, contraction = match
+            braille_text += contraction
+            uncontracted = position
+
+        braille_text += brailfun.translate(folded_text[uncontracted:])
+        return bytes(braille_text)
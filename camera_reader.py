@@ -1,12 +1,611 @@
+import abc
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
 import cv2
 import numpy as np
 
-def camera_reader(model, image_size: tuple=(600, 400), image_crop: float=2/3, blur_amount: int=5):
+
+class FrameSource(abc.ABC):
+    """Frames the ocr reads from, a live camera (CameraSession), a video file (VideoFileSource) or a directory of
+    images (ImageDirectorySource). They are used with the same camera_reader and read_text pipeline.
+
+    Methods
+    -------
+    start
+        Open the source.
+    read
+        Next frame, None when there are no more frames.
+    release
+        Close the source.
+    frames
+        Iterate over the frames until the source runs out of them.
+    """
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def start(self):
+        pass
+
+    @abc.abstractmethod
+    def read(self, timeout: float=5.0):
+        """Next frame, None when there are no more frames, every source implements it."""
+
+    def release(self):
+        pass
+
+    def frames(self):
+        frame = self.read()
+        while frame is not None:
+            yield frame
+            frame = self.read()
+
+
+class CameraSession(FrameSource):
+    """Keep the camera open with a background thread grabbing its frames, so a frame is ready when the ocr needs it.
+
+    Only the latest frames are kept, the older ones are dropped as new frames arrive.
+
+    Attributes
+    ----------
+    device : int
+        cv2.VideoCapture device index, by default 0
+    buffer_size : int
+        Frames kept in the ring buffer, by default 2
+    frames_grabbed : int
+        Frames read from the camera since the session started.
+
+    Methods
+    -------
+    start
+        Open the camera and start the grabber thread.
+    read
+        Latest frame grabbed.
+    release
+        Stop the grabber thread and release the camera.
+    """
+
+    def __init__(self, device: int=0, buffer_size: int=2):
+        self.device = device
+        self.buffer_size = buffer_size
+        self.frames_grabbed = 0
+        self._frames = deque(maxlen=buffer_size)
+        self._new_frame = threading.Condition()
+        self._capture = None
+        self._grabber = None
+        self._running = False
+
+    def __repr__(self):
+        return f"CameraSession({self.device}, {self.buffer_size}, open={self.is_open()})"
+
+    def is_open(self) -> bool:
+        return self._running
+
+    def start(self):
+        """Open the camera and start the grabber thread, does nothing if the session is already open."""
+
+        if self._running:
+            return
+
+        self._capture = cv2.VideoCapture(self.device)
+        if not self._capture.isOpened():
+            self._capture.release()
+            self._capture = None
+            raise RuntimeError(f"camera {self.device} could not be opened")
+
+        self._running = True
+        self._grabber = threading.Thread(target=self._grab_loop, name="camera-grabber", daemon=True)
+        self._grabber.start()
+
+    def _grab_loop(self):
+        while self._running:
+            ret, frame = self._capture.read()
+            if not ret:
+                # The camera is still settling or was unplugged, retry without spinning
+                time.sleep(0.05)
+                continue
+
+            with self._new_frame:
+                self._frames.append(frame)
+                self.frames_grabbed += 1
+                self._new_frame.notify_all()
+
+    def read(self, timeout: float=5.0):
+        """Latest frame grabbed, waits for the first frame after the camera is opened.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for the first frame, by default 5.0
+
+        Returns
+        -------
+        frame: numpy.ndarray
+            BGR image, None if the session is closed or no frame arrived before the timeout.
+        """
+
+        with self._new_frame:
+            if not self._frames and self._running:
+                self._new_frame.wait_for(lambda: self._frames or not self._running, timeout)
+            return self._frames[-1] if self._frames else None
+
+    def release(self):
+        """Stop the grabber thread and release the camera."""
+
+        if not self._running:
+            return
+
+        self._running = False
+        with self._new_frame:
+            self._new_frame.notify_all()
+        self._grabber.join()
+        self._capture.release()
+        self._capture = None
+        self._grabber = None
+        self._frames.clear()
+
+
+class VideoFileSource(FrameSource):
+    """Replay a recorded video frame by frame, Ex. a page recorded with the device camera.
+
+    Attributes
+    ----------
+    path : str
+        Video file.
+    frames_read : int
+        Frames read since the source was opened, the index of the last frame is frames_read - 1.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames_read = 0
+        self._capture = None
+
+    def __repr__(self):
+        return f"VideoFileSource({self.path!r})"
+
+    def start(self):
+        if self._capture is not None:
+            return
+
+        self._capture = cv2.VideoCapture(self.path)
+        if not self._capture.isOpened():
+            self._capture = None
+            raise RuntimeError(f"video {self.path} could not be opened")
+        self.frames_read = 0
+
+    def read(self, timeout: float=5.0):
+        """Next frame of the video, None at the end or if the source isn't open."""
+
+        if self._capture is None:
+            return None
+        ret, frame = self._capture.read()
+        if not ret:
+            return None
+        self.frames_read += 1
+        return frame
+
+    def release(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+
+class ImageDirectorySource(FrameSource):
+    """Read the images of a directory in name order as frames.
+
+    Attributes
+    ----------
+    path : str
+        Directory with the images.
+    extensions : tuple
+        File extensions read, by default (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+    files : list
+        Image files in read order, filled by start.
+    name : str
+        File of the last frame read, Ex. to look up its label.
+    """
+
+    def __init__(self, path: str, extensions: tuple=(".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")):
+        self.path = path
+        self.extensions = extensions
+        self.files = []
+        self.name = None
+        self._next = None
+
+    def __repr__(self):
+        return f"ImageDirectorySource({self.path!r}, {len(self.files)} images)"
+
+    def start(self):
+        if self._next is not None:
+            return
+
+        if not os.path.isdir(self.path):
+            raise RuntimeError(f"{self.path} is not a directory")
+        self.files = sorted(file for file in os.listdir(self.path) if file.lower().endswith(self.extensions))
+        self._next = 0
+
+    def read(self, timeout: float=5.0):
+        """Next image, None after the last one or if the source isn't open. Unreadable files are skipped."""
+
+        while self._next is not None and self._next < len(self.files):
+            self.name = self.files[self._next]
+            self._next += 1
+            frame = cv2.imread(os.path.join(self.path, self.name))
+            if frame is not None:
+                return frame
+            print(f"ERROR: {self.name} could not be read as an image")
+
+        return None
+
+    def release(self):
+        self._next = None
+
+
+def frame_source(source) -> FrameSource:
+    """Frame source of a camera index, a directory of images or a video file, Ex. frame_source(0), frame_source("pages/").
+
+    Parameters
+    ----------
+    source : int or str
+        Camera device index (also as a string, Ex. "0"), directory path or video file path.
+
+    Returns
+    -------
+    frame_source: FrameSource
+        Source not opened yet.
+    """
+
+    if isinstance(source, int) or str(source).isdigit():
+        return CameraSession(int(source))
+    if os.path.isdir(source):
+        return ImageDirectorySource(source)
+    return VideoFileSource(source)
+
+
+class FrameChangeDetector:
+    """Tell if the camera is looking at something new comparing small grayscale copies of the frames.
+
+    The difference is the mean absolute difference of the pixels (0 to 255) between the frame and the last
+    frame that was considered a change, so slow drifts add up until they count as a change too.
+
+    Attributes
+    ----------
+    threshold : float
+        Mean absolute difference above which the frame changed, by default 6.0
+    size : tuple
+        Dimensions the frames are downscaled to before comparing them, by default (32, 24)
+    difference : float
+        Difference of the last frame checked, None before the first frame.
+    """
+
+    def __init__(self, threshold: float=6.0, size: tuple=(32, 24)):
+        self.threshold = threshold
+        self.size = size
+        self.difference = None
+        self._reference = None
+
+    def __repr__(self):
+        return f"FrameChangeDetector({self.threshold}, {self.size})"
+
+    def changed(self, frame) -> bool:
+        """Check a BGR or grayscale frame, the first frame is always a change."""
+
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        if self._reference is None:
+            self.difference = None
+            self._reference = small
+            return True
+
+        self.difference = float(cv2.absdiff(small, self._reference).mean())
+        if self.difference <= self.threshold:
+            return False
+
+        self._reference = small
+        return True
+
+    def reset(self):
+        """Forget the last frame, the next frame is a change."""
+        self._reference = None
+        self.difference = None
+
+
+class OcrCache:
+    """Least recently used cache of the characters recognized for each 10x10 roi, skips the classifier for the glyphs seen before.
+
+    The key is the 100 bytes of the resized roi, identical glyphs give the same bytes in every frame.
+
+    Attributes
+    ----------
+    size : int
+        Maximum number of rois kept, by default 4096
+    hits : int
+        Lookups found in the cache.
+    misses : int
+        Lookups that had to be classified.
+    """
+
+    def __init__(self, size: int=4096):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._characters = OrderedDict()
+
+    def __repr__(self):
+        return f"OcrCache({len(self._characters)}/{self.size}, hits={self.hits}, misses={self.misses})"
+
+    def __len__(self):
+        return len(self._characters)
+
+    def get(self, key: bytes) -> str:
+        """Character of a roi, None if it isn't cached."""
+
+        character = self._characters.get(key)
+        if character is None:
+            self.misses += 1
+            return None
+
+        self._characters.move_to_end(key)
+        self.hits += 1
+        return character
+
+    def put(self, key: bytes, character: str):
+        """Cache the character of a roi, the least recently used roi is dropped when the cache is full."""
+
+        self._characters[key] = character
+        self._characters.move_to_end(key)
+        while len(self._characters) > self.size:
+            self._characters.popitem(last=False)
+
+    def clear(self):
+        """Forget the cached rois and the counters, Ex. after loading another model."""
+        self._characters.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def _reading_order(boxes: list) -> list:
+    """Group character bounding boxes in lines in reading order, lines from top to bottom and each line from left to right.
+
+    A box starts a new line when its vertical center is below the bottom of the current line. The boxes nested
+    inside another box, Ex. the hole of an "o", are dropped.
+
+    Parameters
+    ----------
+    boxes : list
+        (x, y, w, h) bounding boxes.
+
+    Returns
+    -------
+    lines: list
+        One list of box indexes per line, in reading order.
+    """
+
+    def nested(index: int) -> bool:
+        x, y, w, h = boxes[index]
+        return any(ox <= x and oy <= y and x+w <= ox+ow and y+h <= oy+oh and (boxes[other] != boxes[index] or other < index)
+                   for other, (ox, oy, ow, oh) in enumerate(boxes) if other != index)
+
+    outer = [index for index in range(len(boxes)) if not nested(index)]
+
+    lines = []
+    line_bottom = -1
+    for index in sorted(outer, key=lambda index: boxes[index][1]):
+        x, y, w, h = boxes[index]
+        if not lines or y + h/2 > line_bottom:
+            lines.append([])
+            line_bottom = y + h
+        lines[-1].append(index)
+        line_bottom = max(line_bottom, y + h)
+
+    return [sorted(line, key=lambda index: boxes[index][0]) for line in lines]
+
+def _join_words(lines: list, boxes: list, characters: list, word_gap: float) -> str:
+    """Join the characters of each line with a space between the lines and between the characters of a line further
+    apart than word_gap times the median character width of the line, characters are in the order of the lines."""
+
+    text = []
+    row = 0
+    for line in lines:
+        if text:
+            text.append(" ")
+        width = float(np.median([boxes[index][2] for index in line]))
+        for position, index in enumerate(line):
+            if position:
+                x, y, w, h = boxes[line[position-1]]
+                if boxes[index][0] - (x + w) > word_gap*width:
+                    text.append(" ")
+            text.append(characters[row])
+            row += 1
+
+    return "".join(text)
+
+class Profile:
+    """Preprocessing settings of the ocr, they trade cpu time for reading accuracy.
+
+    The contour thresholds and the accent margin are given for a 400 px high image and scaled with image_size.
+
+    Attributes
+    ----------
+    image_size : tuple
+        Dimensions of the frame resizing (width, height), by default (600, 400)
+    image_crop : float
+        Zone of the image that will be processed from the left (from 0 to 1.0), by default 2/3
+    blur_amount : int
+        Gaussian blur kernel size, odd, by default 5
+    block_size : int
+        Adaptive threshold neighbourhood size, odd, by default 31
+    crop_first : bool
+        Crop and convert the frame to gray before resizing it, so only the processed zone of one channel is resized,
+        by default False (resize the whole color frame first)
+    min_area : float
+        Minimum contour area of a character at 400 px high, by default 2000
+    min_height : int
+        Minimum character height at 400 px high, by default 100
+    accent_margin : int
+        Pixels above a character added to its roi to include the accents at 400 px high, by default 50
+    word_gap : float
+        Horizontal gap between two characters of a line, relative to the median character width, that separates
+        two words, by default 0.5
+    """
+
+    def __init__(self, image_size: tuple=(600, 400), image_crop: float=2/3, blur_amount: int=5, block_size: int=31, crop_first: bool=False,
+                 min_area: float=2000, min_height: int=100, accent_margin: int=50, word_gap: float=0.5):
+        self.image_size = tuple(image_size)
+        self.image_crop = image_crop
+        self.blur_amount = blur_amount
+        self.block_size = block_size
+        self.crop_first = crop_first
+        self.min_area = min_area
+        self.min_height = min_height
+        self.accent_margin = accent_margin
+        self.word_gap = word_gap
+
+    def __repr__(self):
+        return (f"Profile({self.image_size}, {self.image_crop:.3g}, {self.blur_amount}, {self.block_size}, crop_first={self.crop_first}, "
+                f"min_area={self.min_area}, min_height={self.min_height}, accent_margin={self.accent_margin}, word_gap={self.word_gap})")
+
+    def scale(self) -> float:
+        """Size of the processed image relative to the 400 px high reference."""
+        return self.image_size[1]/400
+
+
+# Ex. camera_reader(model, profile=PROFILES["fast"])
+PROFILES = {
+    "default": Profile(),
+    "fast": Profile(image_size=(300, 200), blur_amount=3, block_size=15, crop_first=True),
+    "tiny": Profile(image_size=(240, 160), blur_amount=3, block_size=11, crop_first=True),
+}
+
+def _preprocess(frame, profile: Profile):
+    """Crop, convert to gray and resize a frame as the profile says."""
+
+    if not profile.crop_first:
+        img = cv2.resize(frame,profile.image_size)
+        img = img[:,0:int(len(img[0])*profile.image_crop)]
+        return cv2.cvtColor(img,cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    img = frame[:,0:int(len(frame[0])*profile.image_crop)]
+    gray = cv2.cvtColor(img,cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    size = (int(profile.image_size[0]*profile.image_crop), profile.image_size[1])
+    return cv2.resize(gray,size,interpolation=cv2.INTER_AREA)
+
+def read_text(frame, model, profile: Profile=PROFILES["default"], ocr_cache: OcrCache=None, timings: dict=None) -> str:
+    """Recognize the characters of a frame.
+
+    Parameters
+    ----------
+    frame : numpy.ndarray
+        BGR or grayscale image.
+    model : cv2.ml.KNearest or ocr_model.OcrModel
+        Trained ocr model
+    profile : Profile, optional
+        Preprocessing settings, by default PROFILES["default"]
+    ocr_cache : OcrCache, optional
+        Characters already recognized for each roi, only the rois not cached are classified, by default None
+    timings : dict, optional
+        Filled with the seconds each stage took, "preprocess", "blur", "threshold", "contours", "rois" and "classify"
+
+    Returns
+    -------
+    read_text: str
+        Recognized characters in reading order with a space between the words and the lines, "" if there isn't any.
+    """
+
+    t_stage = time.perf_counter()
+    def lap(stage: str):
+        nonlocal t_stage
+        if timings is not None:
+            t_now = time.perf_counter()
+            timings[stage] = t_now - t_stage
+            t_stage = t_now
+
+    scale = profile.scale()
+    gray = _preprocess(frame, profile)
+    lap("preprocess")
+    blur = cv2.GaussianBlur(gray,(profile.blur_amount,)*2,0)
+    lap("blur")
+    thresh = cv2.adaptiveThreshold(blur,255,1,1,profile.block_size,2)
+    lap("threshold")
+    contours,hierarchy = cv2.findContours(thresh,cv2.RETR_LIST,cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = profile.min_area*scale*scale
+    min_height = profile.min_height*scale
+    boxes = []
+    for cnt in contours:
+        if cv2.contourArea(cnt)>min_area:
+            [x,y,w,h] = cv2.boundingRect(cnt)
+            if  h>min_height:
+                boxes.append((x,y,w,h))
+    lap("contours")
+
+    if not boxes:
+        return ""
+
+    margin = int(profile.accent_margin*scale)
+    lines = _reading_order(boxes)
+    order = [index for line in lines for index in line]
+    rois = np.empty((len(order), 100), np.uint8)
+    for row, index in enumerate(order):
+        x,y,w,h = boxes[index]
+        top = y-margin if y >= margin else y     # margin above the character to include the accents
+        rois[row] = cv2.resize(thresh[top:y+h,x:x+w],(10,10)).reshape(100)
+
+    characters = [None]*len(rois)
+    if ocr_cache is not None:
+        keys = [roi.tobytes() for roi in rois]
+        characters = [ocr_cache.get(key) for key in keys]
+    lap("rois")
+
+    # The characters not cached are classified in a single findNearest call, one 10x10 roi per row
+    missing = [row for row, character in enumerate(characters) if character is None]
+    if missing:
+        retval, results, neigh_resp, dists = model.findNearest(np.float32(rois[missing]), k = 1)
+        for row, result in zip(missing, results[:,0]):
+            characters[row] = chr(int(result))
+            if ocr_cache is not None:
+                ocr_cache.put(keys[row], characters[row])
+    lap("classify")
+
+    return _join_words(lines, boxes, characters, profile.word_gap)
+
+def ocr_frame(frame, model, profile: Profile=PROFILES["default"], change_detector: FrameChangeDetector=None, ocr_cache: OcrCache=None, timings: dict=None):
+    """Recognize the characters of a frame unless the change detector saw it already, see read_text.
+
+    Returns
+    -------
+    read_text: str
+        Recognized characters in reading order, "" if there isn't any, None if the frame didn't change.
+    """
+
+    t_ini = time.perf_counter()
+    changed = change_detector is None or change_detector.changed(frame[:,0:int(len(frame[0])*profile.image_crop)])
+    if timings is not None:
+        timings["change"] = time.perf_counter() - t_ini
+
+    if not changed:
+        return None
+
+    return read_text(frame, model, profile, ocr_cache, timings)
+
+def camera_reader(model, image_size: tuple=(600, 400), image_crop: float=2/3, blur_amount: int=5, camera: FrameSource=None, change_detector: FrameChangeDetector=None,
+                  ocr_cache: OcrCache=None, profile: Profile=None, timings: dict=None):
     """ Read the camera input and processes it to get a string using ocr.
 
     Parameters
     ----------
-    model : [type]
+    model : cv2.ml.KNearest or ocr_model.OcrModel
         Trained ocr model
     image_size : tuple, optional
         Dimensions of the image resizing, by default (600, 400)
@@ -14,37 +613,60 @@ def camera_reader(model, image_size: tuple=(600, 400), image_crop: float=2/3, bl
         Zone of the image that will be processed (from 0 to 1.0), by default 2/3
     blur_amount : int, optional
         Amount of blur in the processed image, by default 5
+    camera : FrameSource, optional
+        Open frame source to take the frame from, Ex. a CameraSession or a VideoFileSource, by default None
+        (the camera is opened and released in the call)
+    change_detector : FrameChangeDetector, optional
+        Skip the ocr when the frame is the same the detector saw last time, by default None (always read)
+    ocr_cache : OcrCache, optional
+        Characters already recognized for each roi, only the rois not cached are classified, by default None
+    profile : Profile, optional
+        Preprocessing settings, Ex. PROFILES["fast"], by default None (image_size, image_crop and blur_amount)
+    timings : dict, optional
+        Filled with the seconds each stage took, "capture", "change" and the read_text stages
 
     Returns
     -------
-    read_character: str
-        Recognized character
-    """
-
-    capture = cv2.VideoCapture(0)
-    ret, img = capture.read()
-    img = cv2.resize(img,image_size)
-    width = len(img[0])*image_crop
-    img = img[:,0:int(width)]
-    gray = cv2.cvtColor(img,cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray,(blur_amount,)*2,0)
-    thresh = cv2.adaptiveThreshold(blur,255,1,1,31,2)
-    contours,hierarchy = cv2.findContours(thresh,cv2.RETR_LIST,cv2.CHAIN_APPROX_SIMPLE)
+    read_text: str
+        Recognized characters in reading order, "" if there isn't any, None if the frame didn't change.
+    """
 
-    for cnt in contours:
-        if cv2.contourArea(cnt)>2000:
-            [x,y,w,h] = cv2.boundingRect(cnt)
-            if  h>100:
-                try:
-                    roi = thresh[y-50:y+h,x:x+w]
-                except cv2.error:
-                    roi = thresh[y:y+h,x:x+w]
-                roismall = cv2.resize(roi,(10,10))
-                roismall = roismall.reshape((1,100))
-                roismall = np.float32(roismall)
-                retval, results, neigh_resp, dists = model.findNearest(roismall, k = 1)
-                read_character = str(chr((results[0][0])))
-
-    capture.release()
-    cv2.destroyAllWindows()
-    return read_character
\ No newline at end of file
+    if profile is None:
+        profile = Profile(image_size, image_crop, blur_amount)
+
+    t_ini = time.perf_counter()
+    if camera is None:
+        capture = cv2.VideoCapture(0)
+        ret, img = capture.read()
+        capture.release()
+    else:
+        img = camera.read()
+
+    if img is None:
+        print(f"ERROR: no frame could be read from {'the camera' if camera is None else camera}")
+        return ""
+
+    if timings is not None:
+        timings["capture"] = time.perf_counter() - t_ini
+
+    return ocr_frame(img, model, profile, change_detector, ocr_cache, timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the text of a camera, a video file or a directory of images with the rillo ocr.")
+    parser.add_argument("source", help="camera index, video file or directory of images")
+    parser.add_argument("model", help="ocr model directory, see ocr_model.py")
+    parser.add_argument("--profile", default="default", choices=list(PROFILES))
+    parser.add_argument("--engine", default="numpy", choices=["numpy", "opencv"])
+    args = parser.parse_args()
+
+    from ocr_model import OcrModel
+
+    model = OcrModel(args.model, engine=args.engine)
+    with frame_source(args.source) as source:
+        for index, frame in enumerate(source.frames()):
+            timings = {}
+            text = read_text(frame, model, PROFILES[args.profile], timings=timings)
+            print(f"{getattr(source, 'name', None) or index}: {text!r} ({sum(timings.values())*1e3:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
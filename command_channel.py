@@ -0,0 +1,263 @@
+""" Receive the commands of the app as events from a Firestore snapshot listener instead of polling the document.
+
+The channel keeps a local copy of the document fields, listeners deliver the whole document on every change and
+only the fields whose value changed are reported, so the firmware doesn't redo work for fields that stay the same.
+The fields the firmware wrote with set_local stay on top of the snapshots until their write is committed, a write
+still waiting in a write_buffer.WriteBuffer isn't undone by a snapshot of another change.
+
+Ex.
+    channel = CommandChannel(db.collection(u'rillo-main').document(u'funciones'))
+    channel.start()
+    changed = channel.wait(timeout=1.0)    # set of the fields that changed, empty after the timeout
+    channel.get('recibido')
+"""
+
+import threading
+import time
+
+class CommandChannel:
+    """Local copy of a document kept up to date by its snapshot listener.
+
+    Attributes
+    ----------
+    document : google.cloud.firestore.DocumentReference or FakeDocument
+        Document listened, anything with on_snapshot(callback) returning a watch with unsubscribe().
+    snapshots : int
+        Snapshots received.
+    changes : int
+        Snapshots that changed at least one field.
+
+    Methods
+    -------
+    start
+        Start listening the document.
+    stop
+        Stop listening the document.
+    get
+        Cached value of a field.
+    fields
+        Copy of the cached fields.
+    wait
+        Wait until some fields change.
+    set_local
+        Update the cached fields without reporting a change, Ex. when queueing their write.
+    committed
+        Forget the local fields once their write reached the document.
+    """
+
+    def __init__(self, document):
+        self.document = document
+        self.snapshots = 0
+        self.changes = 0
+        self._fields = {}
+        # Fields written with set_local whose write isn't committed yet, they win over the snapshots
+        self._local = {}
+        self._changed = set()
+        self._received = threading.Condition()
+        self._first_snapshot = threading.Event()
+        self._watch = None
+
+    def __repr__(self):
+        return f"CommandChannel({len(self._fields)} fields, snapshots={self.snapshots}, changes={self.changes}, listening={self._watch is not None})"
+
+    def start(self, timeout: float=10.0) -> bool:
+        """Start listening the document and wait for its first snapshot.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for the first snapshot, by default 10.0
+
+        Returns
+        -------
+        received: bool
+            False if the first snapshot didn't arrive before the timeout, the channel keeps listening anyway.
+        """
+
+        if self._watch is None:
+            self._watch = self.document.on_snapshot(self._on_snapshot)
+
+        if not self._first_snapshot.wait(timeout):
+            print("ERROR: the command channel didn't receive the document, the cached fields are empty")
+            return False
+        return True
+
+    def stop(self):
+        """Stop listening the document, the cached fields are kept."""
+
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, document_snapshots: list, changes, read_time):
+        # Firestore calls it from its own thread with the current document, to_dict() is None if it was deleted
+        fields = {}
+        for document_snapshot in document_snapshots:
+            fields = document_snapshot.to_dict() or {}
+
+        with self._received:
+            # A snapshot with the local value confirms the write, the field follows the document again
+            for field, value in list(self._local.items()):
+                if fields.get(field) == value:
+                    del self._local[field]
+            fields = {**fields, **self._local}
+
+            self.snapshots += 1
+            changed = {field for field in fields.keys() | self._fields.keys() if fields.get(field) != self._fields.get(field)}
+            self._fields = fields
+            if changed:
+                self.changes += 1
+                self._changed |= changed
+                self._received.notify_all()
+
+        self._first_snapshot.set()
+
+    def get(self, field: str, default=None):
+        """Cached value of a field, it doesn't read the document."""
+        with self._received:
+            return self._fields.get(field, default)
+
+    def fields(self) -> dict:
+        """Copy of the cached fields."""
+        with self._received:
+            return dict(self._fields)
+
+    def wait(self, timeout: float=None) -> set:
+        """Wait until some fields change.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait, by default None (until a change arrives)
+
+        Returns
+        -------
+        changed: set
+            Fields that changed since the last wait, empty if the timeout expired first.
+        """
+
+        with self._received:
+            self._received.wait_for(lambda: self._changed, timeout)
+            changed, self._changed = self._changed, set()
+            return changed
+
+    def set_local(self, fields: dict):
+        """Update the cached fields without reporting a change, call it when writing the fields to the document so
+        the snapshot of that write doesn't trigger work. The fields keep their local value until committed is
+        called or a snapshot shows it."""
+
+        with self._received:
+            self._fields.update(fields)
+            self._local.update(fields)
+            self._changed -= fields.keys()
+
+    def committed(self, document, fields: dict):
+        """Forget the local fields once their write reached the document, the next snapshots decide their value.
+
+        It has the signature of the WriteBuffer on_commit callback, the writes of other documents are ignored and
+        a field set_local changed again since that write keeps its newer local value.
+        """
+
+        if getattr(document, "path", None) != getattr(self.document, "path", None):
+            return
+
+        with self._received:
+            for field, value in fields.items():
+                if field in self._local and self._local[field] == value:
+                    del self._local[field]
+
+
+class _FakeWatch:
+    """Watch returned by FakeDocument.on_snapshot."""
+
+    def __init__(self, document, callback):
+        self.document = document
+        self.callback = callback
+
+    def unsubscribe(self):
+        if self in self.document._watches:
+            self.document._watches.remove(self)
+
+
+class _FakeSnapshot:
+    """Document snapshot delivered by FakeDocument."""
+
+    def __init__(self, fields: dict):
+        self.exists = fields is not None
+        self._fields = fields
+
+    def to_dict(self) -> dict:
+        return None if self._fields is None else dict(self._fields)
+
+
+class FakeDocument:
+    """In-memory stand-in for a Firestore DocumentReference to run the firmware and the channel without network.
+
+    Every set, update or delete notifies the snapshot listeners right away from the caller thread, a new listener
+    receives the current document when it subscribes like in Firestore.
+
+    Attributes
+    ----------
+    path : str
+        Document path, Ex. "rillo-main/funciones"
+    writes : list
+        (time.perf_counter() timestamp, method name, fields) of every write.
+    """
+
+    def __init__(self, fields: dict=None, path: str="fake/document"):
+        self.path = path
+        self._fields = None if fields is None else dict(fields)
+        self._watches = []
+        self._lock = threading.Lock()
+        self.writes = []
+
+    def __repr__(self):
+        return f"FakeDocument({self.path!r}, {self._fields})"
+
+    def get(self) -> _FakeSnapshot:
+        return _FakeSnapshot(self._fields)
+
+    def set(self, fields: dict):
+        self._write("set", dict(fields))
+
+    def update(self, fields: dict):
+        if self._fields is None:
+            raise KeyError("the document doesn't exist")
+        self._write("update", {**self._fields, **fields}, fields)
+
+    def delete(self):
+        self._write("delete", None)
+
+    def on_snapshot(self, callback) -> _FakeWatch:
+        watch = _FakeWatch(self, callback)
+        self._watches.append(watch)
+        callback([_FakeSnapshot(self._fields)], [], time.time())
+        return watch
+
+    def _write(self, name: str, fields: dict, written: dict=None):
+        with self._lock:
+            self.writes.append((time.perf_counter(), name, written if written is not None else fields))
+            self._fields = fields
+            for watch in list(self._watches):
+                watch.callback([_FakeSnapshot(fields)], [], time.time())
+
+
+class FakeBatch:
+    """In-memory stand-in for a Firestore WriteBatch, the updates are applied to the FakeDocuments on commit.
+
+    Pass the class where db.batch is expected, Ex. WriteBuffer(FakeBatch).
+    """
+
+    commits = 0
+
+    def __init__(self):
+        self._updates = []
+
+    def update(self, document: FakeDocument, fields: dict):
+        self._updates.append((document, dict(fields)))
+
+    def commit(self):
+        FakeBatch.commits += 1
+        for document, fields in self._updates:
+            document.update(fields)
+        self._updates = []
@@ -0,0 +1,393 @@
+"""Select the gpio and spi backends used by rillo, pigpio and spidev in the raspberry pi zero or recording fakes to run off-device.
+
+The backend is chosen with the RILLO_BACKEND environment variable, "pigpio" (default) or "fake". The fakes
+timestamp every call so the haptic path and the battery measurement can be profiled on any linux machine.
+"""
+
+import os
+import time
+
+BACKEND = os.environ.get("RILLO_BACKEND", "pigpio")
+
+# pigpio constants
+INPUT = 0
+OUTPUT = 1
+RISING_EDGE = 0
+FALLING_EDGE = 1
+EITHER_EDGE = 2
+
+try:
+    from pigpio import pulse, error
+except ImportError:
+    class pulse:
+        """A waveform pulse, same fields as pigpio.pulse."""
+
+        def __init__(self, gpio_on: int, gpio_off: int, delay: int):
+            self.gpio_on = gpio_on
+            self.gpio_off = gpio_off
+            self.delay = delay
+
+    class error(Exception):
+        """Error raised by the gpio backend, pigpio.error when pigpio is installed."""
+
+
+def gpio(backend: str=None):
+    """Open a gpio session.
+
+    Parameters
+    ----------
+    backend : str, optional
+        "pigpio" or "fake", by default the RILLO_BACKEND value.
+
+    Returns
+    -------
+    pi: pigpio.pi or FakePi
+        Gpio session, both expose the pigpio.pi methods used by rillo.
+    """
+
+    backend = backend or BACKEND
+    if backend == "pigpio":
+        import pigpio
+        return pigpio.pi()
+    elif backend == "fake":
+        return FakePi()
+    else:
+        raise ValueError(f"Unknown gpio backend {backend}, expected pigpio or fake")
+
+def spi(backend: str=None):
+    """Create a spi device, it still has to be opened.
+
+    Parameters
+    ----------
+    backend : str, optional
+        "pigpio" (spidev) or "fake", by default the RILLO_BACKEND value.
+
+    Returns
+    -------
+    spi: spidev.SpiDev or FakeSpi
+        Spi device.
+    """
+
+    backend = backend or BACKEND
+    if backend == "pigpio":
+        import spidev
+        return spidev.SpiDev()
+    elif backend == "fake":
+        return FakeSpi()
+    else:
+        raise ValueError(f"Unknown spi backend {backend}, expected pigpio or fake")
+
+def read_mcp3008(spi_device, channel: int) -> int:
+    """Read a channel of the MCP3008 analog to digital converter.
+
+    Parameters
+    ----------
+    spi_device : spidev.SpiDev or FakeSpi
+        Opened spi device connected to the MCP3008.
+    channel : int(0 to 7)
+        Converter channel.
+
+    Returns
+    -------
+    data: int
+        10 bit reading, from 0 to 1023.
+    """
+
+    spi_device.max_speed_hz = 1350000
+    adc = spi_device.xfer2([1,(8+channel)<<4,0])
+    return ((adc[1]&3) << 8) + adc[2]
+
+
+LATENCY_BUCKETS = 24
+
+class InstrumentedPi:
+    """Wrap a gpio session to count its calls and keep a latency histogram of each method.
+
+    The histogram bucket i holds the calls that took from 2**(i-1) to 2**i microseconds (bucket 0 under 1 us),
+    the last bucket holds every slower call. The other attributes are read from the wrapped session.
+
+    Attributes
+    ----------
+    pi: pigpio.pi or FakePi
+        Wrapped gpio session.
+    calls: int
+        Calls made through the wrapper.
+    histograms: dict
+        Method name -> list of LATENCY_BUCKETS call counts.
+    """
+
+    def __init__(self, pi):
+        self.pi = pi
+        self.calls = 0
+        self.histograms = {}
+
+    def __repr__(self):
+        return f"InstrumentedPi({self.pi!r}, {self.calls} calls)"
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.pi, name)
+        if not callable(attribute):
+            return attribute
+
+        histogram = self.histograms.setdefault(name, [0]*LATENCY_BUCKETS)
+        perf_counter_ns = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            t_ini = perf_counter_ns()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                histogram[min(LATENCY_BUCKETS - 1, ((perf_counter_ns() - t_ini)//1000).bit_length())] += 1
+                self.calls += 1
+
+        # Cached in the instance so the next calls don't go through __getattr__
+        setattr(self, name, timed)
+        return timed
+
+    def snapshot(self) -> dict:
+        """Calls and latency histogram of each method called, Ex. {"write": {"calls": 2, "latency_us": {2: 1, 64: 1}}}.
+
+        The latency_us keys are the upper bound in microseconds of each non empty bucket.
+        """
+
+        return {
+            name: {"calls": sum(histogram), "latency_us": {1 << bucket: count for bucket, count in enumerate(histogram) if count}}
+            for name, histogram in self.histograms.items() if any(histogram)
+        }
+
+    def reset_stats(self):
+        """Forget the counted calls."""
+        self.calls = 0
+        for histogram in self.histograms.values():
+            histogram[:] = [0]*LATENCY_BUCKETS
+
+
+class _Recorder:
+    """Keep a timestamped log of the calls made to a fake device.
+
+    Attributes
+    ----------
+    events: list
+        (time.perf_counter() timestamp, method name, arguments) tuples in call order.
+    call_latency: float
+        Seconds each call busy waits to emulate the round-trip to the real device, by default 0.
+    """
+
+    def __init__(self, call_latency: float=0.0):
+        self.events = []
+        self.call_latency = call_latency
+
+    def _record(self, name: str, *args):
+        if self.call_latency:
+            t_end = time.perf_counter() + self.call_latency
+            while time.perf_counter() < t_end:
+                pass
+        self.events.append((time.perf_counter(), name, args))
+
+    def count(self, name: str=None) -> int:
+        """Number of recorded calls, only the calls to the method name if given."""
+        if name is None:
+            return len(self.events)
+        return sum(1 for event in self.events if event[1] == name)
+
+    def reset(self):
+        """Forget the recorded calls."""
+        self.events = []
+
+
+class _FakeCallback:
+    """Callback handle returned by FakePi.callback."""
+
+    def __init__(self, pi, user_gpio: int, edge: int, func):
+        self.pi = pi
+        self.gpio = user_gpio
+        self.edge = edge
+        self.func = func
+        self.tally = 0
+
+    def cancel(self):
+        if self in self.pi._callbacks:
+            self.pi._callbacks.remove(self)
+
+
+class FakePi(_Recorder):
+    """In-process stand-in for pigpio.pi that records every call instead of driving the gpio pins.
+
+    Pin levels, pwm duty cycles and waveforms are kept so reads and wave_tx_busy behave like the daemon,
+    waveforms are considered transmitting for the duration of their pulses.
+    """
+
+    def __init__(self, call_latency: float=0.0):
+        super().__init__(call_latency)
+        self.connected = True
+        self.modes = {}
+        self.levels = {}
+        self.dutycycles = {}
+        self._callbacks = []
+        self._pulses = []
+        self._waves = {}
+        self._next_wave_id = 0
+        self._wave_end = 0.0
+
+    def stop(self):
+        self._record("stop")
+        self.connected = False
+
+    def set_mode(self, gpio: int, mode: int) -> int:
+        self._record("set_mode", gpio, mode)
+        self.modes[gpio] = mode
+        return 0
+
+    def get_mode(self, gpio: int) -> int:
+        self._record("get_mode", gpio)
+        return self.modes.get(gpio, INPUT)
+
+    def write(self, gpio: int, level: int) -> int:
+        self._record("write", gpio, level)
+        self.dutycycles.pop(gpio, None)
+        self._set_level(gpio, int(bool(level)))
+        return 0
+
+    def read(self, gpio: int) -> int:
+        self._record("read", gpio)
+        return self.levels.get(gpio, 0)
+
+    def set_PWM_dutycycle(self, user_gpio: int, dutycycle: int) -> int:
+        self._record("set_PWM_dutycycle", user_gpio, int(dutycycle))
+        self.dutycycles[user_gpio] = int(dutycycle)
+        return 0
+
+    def get_PWM_dutycycle(self, user_gpio: int) -> int:
+        self._record("get_PWM_dutycycle", user_gpio)
+        return self.dutycycles.get(user_gpio, 0)
+
+    def set_bank_1(self, bits: int) -> int:
+        self._record("set_bank_1", bits)
+        self._write_bits(bits, 1)
+        return 0
+
+    def clear_bank_1(self, bits: int) -> int:
+        self._record("clear_bank_1", bits)
+        self._write_bits(bits, 0)
+        return 0
+
+    def read_bank_1(self) -> int:
+        self._record("read_bank_1")
+        return sum(1 << gpio for gpio, level in self.levels.items() if level)
+
+    def set_glitch_filter(self, user_gpio: int, steady: int) -> int:
+        self._record("set_glitch_filter", user_gpio, steady)
+        return 0
+
+    def callback(self, user_gpio: int, edge: int=RISING_EDGE, func=None) -> _FakeCallback:
+        self._record("callback", user_gpio, edge)
+        callback = _FakeCallback(self, user_gpio, edge, func)
+        self._callbacks.append(callback)
+        return callback
+
+    def get_current_tick(self) -> int:
+        return int(time.perf_counter()*1e6) & 0xFFFFFFFF
+
+    def wave_clear(self) -> int:
+        self._record("wave_clear")
+        self._pulses = []
+        self._waves = {}
+        return 0
+
+    def wave_add_generic(self, pulses: list) -> int:
+        self._record("wave_add_generic", len(pulses))
+        self._pulses += pulses
+        return len(self._pulses)
+
+    def wave_create(self) -> int:
+        self._record("wave_create")
+        wave_id = self._next_wave_id
+        self._next_wave_id += 1
+        self._waves[wave_id] = self._pulses
+        self._pulses = []
+        return wave_id
+
+    def wave_delete(self, wave_id: int) -> int:
+        self._record("wave_delete", wave_id)
+        self._waves.pop(wave_id, None)
+        return 0
+
+    def wave_send_once(self, wave_id: int) -> int:
+        self._record("wave_send_once", wave_id)
+        self._wave_end = time.perf_counter() + self._wave_duration(wave_id)
+        return len(self._waves[wave_id])
+
+    def wave_chain(self, data: list) -> int:
+        self._record("wave_chain", len(data))
+        duration = 0.0
+        index = 0
+        while index < len(data):
+            if data[index] == 255 and data[index+1] == 0:
+                # loop start, the wave before the loop end command repeats x + 256*y times
+                wave_id = data[index+2]
+                repeats = data[index+5] + 256*data[index+6]
+                duration += self._wave_duration(wave_id)*repeats
+                index += 7
+            else:
+                duration += self._wave_duration(data[index])
+                index += 1
+        self._wave_end = time.perf_counter() + duration
+        return 0
+
+    def wave_tx_busy(self) -> int:
+        self._record("wave_tx_busy")
+        return int(time.perf_counter() < self._wave_end)
+
+    def wave_tx_stop(self) -> int:
+        self._record("wave_tx_stop")
+        self._wave_end = 0.0
+        return 0
+
+    def _wave_duration(self, wave_id: int) -> float:
+        if wave_id not in self._waves:
+            raise error(f"wave {wave_id} doesn't exist")
+        return sum(wave_pulse.delay for wave_pulse in self._waves[wave_id])/1e6
+
+    def _write_bits(self, bits: int, level: int):
+        for gpio in range(32):
+            if bits & (1 << gpio):
+                self._set_level(gpio, level)
+
+    def _set_level(self, gpio: int, level: int):
+        # Level changes reach the callbacks like in pigpio, lets the buttons be simulated with write()
+        changed = self.levels.get(gpio, 0) != level
+        self.levels[gpio] = level
+        if not changed:
+            return
+        for callback in list(self._callbacks):
+            if callback.gpio == gpio and (callback.edge == EITHER_EDGE or callback.edge == (RISING_EDGE if level else FALLING_EDGE)):
+                callback.tally += 1
+                if callback.func is not None:
+                    callback.func(gpio, level, self.get_current_tick())
+
+
+class FakeSpi(_Recorder):
+    """In-process stand-in for spidev.SpiDev connected to a MCP3008 analog to digital converter.
+
+    Attributes
+    ----------
+    adc_values: dict
+        10 bit reading returned for each converter channel, by default 778 (3.8 V) in every channel.
+    """
+
+    def __init__(self, call_latency: float=0.0):
+        super().__init__(call_latency)
+        self.max_speed_hz = 0
+        self.adc_values = {}
+
+    def open(self, bus: int, device: int):
+        self._record("open", bus, device)
+
+    def close(self):
+        self._record("close")
+
+    def xfer2(self, data: list) -> list:
+        self._record("xfer2", list(data))
+        channel = (data[1] >> 4) - 8
+        value = self.adc_values.get(channel, 778)
+        return [0, (value >> 8) & 3, value & 0xFF]
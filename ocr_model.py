@@ -0,0 +1,189 @@
+""" Store the ocr training set as numpy arrays that are memory mapped when rillo boots.
+
+A model is a directory with two files:
+    samples.npy - (N, 100) float32, one 10x10 roi per row as camera_reader produces them.
+    responses.npy - (N, 1) float32, character code (ord) of each sample.
+
+Ex. python ocr_model.py generalsamples.data generalresponses.data /home/pi/ocr_model
+converts a training set saved with np.savetxt to the model format.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+SAMPLES_FILE = "samples.npy"
+RESPONSES_FILE = "responses.npy"
+
+def save_model(path: str, samples, responses):
+    """Save a training set in the model format.
+
+    Parameters
+    ----------
+    path : str
+        Model directory, created if it doesn't exist.
+    samples : array_like
+        (N, 100) rois, one per row.
+    responses : array_like
+        N character codes, Ex. [ord("a"), ord("b")].
+    """
+
+    samples = np.asarray(samples, np.float32)
+    responses = np.asarray(responses, np.float32).reshape(-1, 1)
+    if samples.ndim != 2 or samples.shape[1] != 100:
+        raise ValueError(f"samples must have shape (N, 100), got {samples.shape}")
+    if len(samples) != len(responses):
+        raise ValueError(f"{len(samples)} samples but {len(responses)} responses")
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, SAMPLES_FILE), samples)
+    np.save(os.path.join(path, RESPONSES_FILE), responses)
+
+
+class NearestNeighbours:
+    """Brute force k nearest neighbours classifier in numpy, a drop-in alternative to cv2.ml.KNearest.
+
+    The squared distances of a batch of rois to every training sample come from one matrix multiply,
+    |x - s|^2 = |x|^2 - 2 x.s + |s|^2 with the squared norms of the samples computed once.
+
+    Attributes
+    ----------
+    samples : numpy.ndarray
+        (N, 100) float32 training rois, a memory mapped array is used without copying it.
+    responses : numpy.ndarray
+        N float32 character codes.
+    """
+
+    def __init__(self, samples, responses):
+        self.samples = samples
+        self.responses = np.asarray(responses, np.float32).reshape(-1)
+        self._norms = np.einsum("ij,ij->i", samples, samples, dtype=np.float32)
+
+    def __repr__(self):
+        return f"NearestNeighbours({len(self.samples)} samples)"
+
+    def findNearest(self, samples, k: int=1):
+        """Classify a batch of rois, the character with most votes among the k nearest samples wins,
+        ties go to the character of the nearest sample.
+
+        Returns
+        -------
+        retval, results, neighborResponses, dist
+            Same values as cv2.ml.KNearest.findNearest, dist holds the squared distances.
+        """
+
+        samples = np.asarray(samples, np.float32)
+        k = min(k, len(self.samples))
+
+        distances = self._norms - 2*(samples @ self.samples.T)
+        distances += np.einsum("ij,ij->i", samples, samples)[:, None]
+        np.maximum(distances, 0, out=distances)
+
+        nearest = np.argpartition(distances, k-1, axis=1)[:, :k]
+        dist = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(dist, axis=1, kind="stable")
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        dist = np.take_along_axis(dist, order, axis=1)
+        neighbour_responses = self.responses[nearest]
+
+        if k == 1:
+            results = neighbour_responses.copy()
+        else:
+            results = np.empty((len(samples), 1), np.float32)
+            for row, responses in enumerate(neighbour_responses):
+                values, first, counts = np.unique(responses, return_index=True, return_counts=True)
+                results[row, 0] = values[np.lexsort((first, -counts))[0]]
+
+        retval = float(results[0, 0]) if len(results) else 0.0
+        return retval, results, neighbour_responses, dist
+
+
+class OcrModel:
+    """Ocr model with the same findNearest as cv2.ml.KNearest, trained the first time it reads.
+
+    The arrays are memory mapped, so opening the model only reads the file headers and the pages of the training
+    set are loaded by the kernel when the classifier is built.
+
+    Attributes
+    ----------
+    path : str
+        Model directory.
+    samples : numpy.memmap
+        (N, 100) float32 training rois.
+    responses : numpy.memmap
+        (N, 1) float32 character codes.
+    engine : str
+        Classifier built from the samples, by default "opencv"
+            opencv - cv2.ml.KNearest, the training set is copied into it.
+            numpy - NearestNeighbours, works over the memory mapped training set.
+
+    Methods
+    -------
+    findNearest
+        Classify a batch of rois, see cv2.ml.KNearest.findNearest.
+    """
+
+    def __init__(self, path: str, engine: str="opencv"):
+        if engine not in ("opencv", "numpy"):
+            raise ValueError(f"Unknown ocr engine {engine}, expected opencv or numpy")
+
+        self.path = path
+        self.engine = engine
+        self.samples = np.load(os.path.join(path, SAMPLES_FILE), mmap_mode="r")
+        self.responses = np.load(os.path.join(path, RESPONSES_FILE), mmap_mode="r")
+        self._classifier = None
+
+        if self.samples.ndim != 2 or self.samples.shape[1] != 100 or len(self.samples) != len(self.responses):
+            raise ValueError(f"{path} is not an ocr model, samples {self.samples.shape} and responses {self.responses.shape}")
+
+    def __repr__(self):
+        return f"OcrModel({self.path!r}, {len(self.samples)} samples, {self.engine!r}, trained={self._classifier is not None})"
+
+    def __len__(self):
+        return len(self.samples)
+
+    def classifier(self):
+        """Classifier trained with the model samples, built the first time it is needed."""
+
+        if self._classifier is None and self.engine == "numpy":
+            self._classifier = NearestNeighbours(self.samples, self.responses)
+        elif self._classifier is None:
+            import cv2
+
+            classifier = cv2.ml.KNearest_create()
+            classifier.train(np.ascontiguousarray(self.samples), cv2.ml.ROW_SAMPLE, np.ascontiguousarray(self.responses))
+            self._classifier = classifier
+
+        return self._classifier
+
+    def findNearest(self, samples, k: int=1):
+        """Classify a batch of rois.
+
+        Parameters
+        ----------
+        samples : numpy.ndarray
+            (M, 100) float32 rois.
+        k : int, optional
+            Neighbours that vote the character, by default 1
+
+        Returns
+        -------
+        retval, results, neighborResponses, dist
+            Same values as cv2.ml.KNearest.findNearest, results is (M, 1) float32 character codes.
+        """
+
+        return self.classifier().findNearest(samples, k)
+
+
+def main():
+    if len(sys.argv) != 4:
+        print(f"usage: python {sys.argv[0]} samples.data responses.data model_directory")
+        sys.exit(1)
+
+    samples_path, responses_path, path = sys.argv[1:]
+    save_model(path, np.loadtxt(samples_path, np.float32), np.loadtxt(responses_path, np.float32))
+    print(f"{OcrModel(path)} saved")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+""" Read with the camera and write in the braille cell at the same time, each stage in its own thread.
+
+    camera grabber (CameraSession) -> ocr thread -> texts queue -> cell thread -> braille cell
+
+The camera keeps grabbing the latest frame while the ocr reads the previous one and the cell plays the text before
+that. The texts queue is bounded, so the ocr waits for the cell once it is queue_size texts ahead and the camera
+frames it didn't read are dropped, the reading never outruns the cell.
+"""
+
+import queue
+import threading
+import time
+
+from camera_reader import PROFILES, ocr_frame
+
+class ReadingPipeline:
+    """Capture, ocr and braille output running concurrently.
+
+    Attributes
+    ----------
+    braille_cell : brailfun.NewCell
+        Cell the texts are written in.
+    model : cv2.ml.KNearest or ocr_model.OcrModel
+        Trained ocr model
+    source : camera_reader.FrameSource
+        Frames to read, Ex. a CameraSession, opened by start if it isn't open.
+    profile : camera_reader.Profile
+        Preprocessing settings, by default PROFILES["default"]
+    change_detector : camera_reader.FrameChangeDetector
+        Frames that didn't change are not read, by default None
+    ocr_cache : camera_reader.OcrCache
+        Characters already recognized for each roi, by default None
+    on_text : callable
+        Called with each new text from the cell thread before it is written, Ex. to upload it, by default None
+    interval : float
+        Minimum seconds between two frames read, by default 0.1
+    frames : int
+        Frames read by the ocr.
+    texts : int
+        New texts sent to the cell, the frames that didn't change and the repeated texts are not sent.
+    last_activity : float
+        time.time() of the last new text or the last moment a text was being written, to tell when the reading is idle.
+
+    Methods
+    -------
+    start
+        Start the ocr and cell threads.
+    stop
+        Stop the threads, the text being written is cancelled.
+    wait
+        Wait until a finite source (Ex. a video file) is read and written.
+    running
+        True while the threads are running.
+    """
+
+    def __init__(self, braille_cell, model, source, profile=PROFILES["default"], change_detector=None, ocr_cache=None, on_text=None, queue_size: int=1, interval: float=0.1):
+        self.braille_cell = braille_cell
+        self.model = model
+        self.source = source
+        self.profile = profile
+        self.change_detector = change_detector
+        self.ocr_cache = ocr_cache
+        self.on_text = on_text
+        self.interval = interval
+        self.frames = 0
+        self.texts = 0
+        self.last_activity = time.time()
+
+        self._texts = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def __repr__(self):
+        return f"ReadingPipeline({self.source!r}, frames={self.frames}, texts={self.texts}, running={self.running()})"
+
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """Open the source and start the ocr and cell threads, does nothing if they are running."""
+
+        if self.running():
+            return
+
+        self.last_activity = time.time()
+        self.source.start()
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._ocr_loop, name="ocr", daemon=True),
+            threading.Thread(target=self._cell_loop, name="cell", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float=None):
+        """Stop the threads, the text being written in the cell is cancelled. The source is left open."""
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+        while not self._texts.empty():
+            self._texts.get_nowait()
+
+    def wait(self, timeout: float=None) -> bool:
+        """Wait until the source runs out of frames and the last text is written, returns False if the timeout expired first."""
+
+        t_end = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            thread.join(None if t_end is None else max(0, t_end - time.time()))
+        return not self.running()
+
+    def _put(self, text) -> bool:
+        """Queue a text for the cell, waiting while the queue is full, False if the pipeline stopped meanwhile."""
+
+        while not self._stop.is_set():
+            try:
+                self._texts.put(text, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _ocr_loop(self):
+        last_text = ""
+        t_frame = 0.0
+        try:
+            while not self._stop.is_set():
+                delay = t_frame + self.interval - time.perf_counter()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                t_frame = time.perf_counter()
+
+                frame = self.source.read()
+                if frame is None:
+                    break
+
+                self.frames += 1
+                text = ocr_frame(frame, self.model, self.profile, self.change_detector, self.ocr_cache)
+
+                # The frame didn't change (None) or it reads the same as the last time, the cell isn't bothered again
+                if text is None or text == last_text:
+                    continue
+                last_text = text
+                if text and not self._put(text):
+                    break
+        except Exception as error:
+            print(f"ERROR: camera reading failed ({error!r})")
+        finally:
+            # The cell thread ends after writing the texts already queued
+            self._put(None)
+
+    def _cell_loop(self):
+        while True:
+            try:
+                text = self._texts.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+
+            if text is None or self._stop.is_set():
+                return
+
+            self.texts += 1
+            self.last_activity = time.time()
+            if self.on_text is not None:
+                try:
+                    self.on_text(text)
+                except Exception as error:
+                    print(f"ERROR: on_text failed ({error!r})")
+
+            try:
+                playback = self.braille_cell.writer(text, block=False)
+                while not playback.wait(0.1):
+                    # A text longer than the idle timeout of the firmware keeps the reading active while it plays
+                    self.last_activity = time.time()
+                    if self._stop.is_set():
+                        playback.cancel()
+            except Exception as error:
+                print(f"ERROR: the text read by the camera could not be written in the braille cell ({error!r})")
+            self.last_activity = time.time()
+
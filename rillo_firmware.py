@@ -1,29 +1,52 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
-os.system("sudo pigpiod")
+import hardware
+if hardware.BACKEND == "pigpio":
+    os.system("sudo pigpiod")
 
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
-import pigpio as GPIO
-import spidev
 import csv
 import time
 import brailfun
-from camera_reader import camera_reader
+import braille_contractions
+from camera_reader import CameraSession, FrameChangeDetector, OcrCache, PROFILES
+from ocr_model import OcrModel
+from reading_pipeline import ReadingPipeline
+from command_channel import CommandChannel
+from write_buffer import WriteBuffer
 
 # Use a service account
 cred = credentials.Certificate(r'/home/pi/rillo-web-firebase-adminsdk-n5611-e48238a56c.json')
 firebase_admin.initialize_app(cred)
 
 db = firestore.client()
+doc_funciones = db.collection(u'rillo-main').document(u'funciones')
+doc_bateria = db.collection(u'rillo-main').document(u'nivel-bateria')
+# Los comandos de la app llegan como eventos del documento funciones, sin leerlo una y otra vez
+canal_funciones = CommandChannel(doc_funciones)
+canal_funciones.start()
+# Las escrituras se juntan y se envian en un solo batch cada 2 segundos, la bateria solo si cambia mas de 0.05 V.
+# Las de funciones se envian de inmediato y el canal las mantiene en su copia local hasta que llegan al documento
+escritura = WriteBuffer(db.batch, interval=2.0, thresholds={u'bateria': 0.05}, on_commit=canal_funciones.committed)
+escritura.start()
 braille_cell = brailfun.NewCell(power=5, time_on=3, time_off=1, signal_type=1)
 pigpio_controller = braille_cell.pi
 braille_cell.init()
-spi = spidev.SpiDev()
+spi = hardware.spi()
 spi.open(0,0)
-ocr_model = ""
+try:
+    ocr_model = OcrModel('/home/pi/ocr_model', engine="numpy")     # Memory mapped, el clasificador se crea en la primera lectura
+except (OSError, ValueError) as error:
+    # Sin modelo el modo digital sigue funcionando, solo se desactiva la lectura con la camara
+    print(f"error, no se pudo cargar el modelo ocr ({error}), la lectura con la camara queda desactivada")
+    ocr_model = None
+camara = CameraSession()    # Se abre al entrar al modo analogico y se libera al entrar al modo sleep
+detector_cambios = FrameChangeDetector()    # Evita repetir el ocr cuando la camara sigue viendo lo mismo
+cache_ocr = OcrCache()      # Caracteres ya reconocidos de cada roi, se saltan el modelo
+perfil_ocr = "default"      # Preprocesamiento de la camara, ver camera_reader.PROFILES
 
 print("inicializando")
 
@@ -36,6 +59,8 @@ t_lectura_bateria = 60      # Se mide el nivel de batería cada 60 segundos
 canal_input_bateria = 0     # canal del MCP3008 en el cual ingresa la señal del nivel de bateria, 0 por defecto
 modo_actual = "analogico"   # Modo en el que se encuentra rillo (puede ser digital, analogico o sleep)
 stop_parpadeo_led = False   # Esta variable nos indica si los leds deben dejar de parpadear (solo parpadean cuando rillo tiene la batería baja)
+reproduccion_actual = None  # Ultima reproduccion enviada a la celda braille sin bloquear (brailfun.Playback)
+t_espera_comandos = 0.5     # Segundos maximos esperando un comando antes de revisar los tiempos de los modos
 
 #Leer variables de vibración del csv
 with open('/home/pi/variables_rillo.csv') as csvDataFile:
@@ -49,6 +74,15 @@ with open('/home/pi/variables_rillo.csv') as csvDataFile:
                 braille_cell.time_off = float(row[1])
             elif row[0] == 'signnal':
                 braille_cell.signal_type = int(row[1])
+            elif row[0] == 'contracciones' and int(row[1]):
+                braille_cell.contractor = braille_contractions.Contractor()
+            elif row[0] == 'perfil_ocr' and row[1] in PROFILES:
+                perfil_ocr = row[1]
+
+# Camara -> ocr -> celda braille en hilos separados, la celda escribe un texto mientras se lee el siguiente, None sin modelo ocr
+lectura = None
+if ocr_model is not None:
+    lectura = ReadingPipeline(braille_cell, ocr_model, camara, PROFILES[perfil_ocr], detector_cambios, cache_ocr, on_text=lambda texto: subir_lectura(texto))
 
 
 #Pines
@@ -59,12 +93,12 @@ pin_led_rgb_g = 16                  #pin 36
 pin_led_rgb_b = 13                  #pin 33
 pin_leds_camara = 12                #pin 37
 
-pigpio_controller.set_mode(pin_indicador_encendido, GPIO.OUTPUT)
-pigpio_controller.set_mode(pin_boton_activacion, GPIO.INPUT)
-pigpio_controller.set_mode(pin_boton_bateria, GPIO.INPUT)
-pigpio_controller.set_mode(pin_led_rgb_g, GPIO.OUTPUT)
-pigpio_controller.set_mode(pin_led_rgb_b, GPIO.OUTPUT)
-pigpio_controller.set_mode(pin_leds_camara, GPIO.OUTPUT)   
+pigpio_controller.set_mode(pin_indicador_encendido, hardware.OUTPUT)
+pigpio_controller.set_mode(pin_boton_activacion, hardware.INPUT)
+pigpio_controller.set_mode(pin_boton_bateria, hardware.INPUT)
+pigpio_controller.set_mode(pin_led_rgb_g, hardware.OUTPUT)
+pigpio_controller.set_mode(pin_led_rgb_b, hardware.OUTPUT)
+pigpio_controller.set_mode(pin_leds_camara, hardware.OUTPUT)   
 
 pigpio_controller.set_glitch_filter(pin_boton_activacion, 500)
 pigpio_controller.set_glitch_filter(pin_boton_bateria, 500)
@@ -86,16 +120,16 @@ def saludo():
     current_braille_parameters = braille_cell.parameters()
     braille_cell.parameters(4, 0.5, 0.5, 1)
     for punto in r_braille:
-        celda_braille = [0, 0, 0, 0, 0, 0]
-        celda_braille[punto] = 1
-        braille_cell.trigger(celda_braille)
+        braille_cell.trigger(1 << punto)
     braille_cell.parameters(current_braille_parameters["power"], current_braille_parameters["time_on"], current_braille_parameters["time_off"], current_braille_parameters["signal_type"])
 
 def apagado_automatico():
     print("rillo out")
+    escritura.stop()
     braille_cell.close()
     spi.close()
-    os.system('sudo killall pigpiod')
+    if hardware.BACKEND == "pigpio":
+        os.system('sudo killall pigpiod')
     ############################################################ os.system('sudo shutdown -h now')
 
 def potencia_leds_camara(potencia):
@@ -160,19 +194,11 @@ def medir_bateria():
     
     global nivel_bateria, canal_input_bateria, stop_parpadeo_led
 
-    spi.max_speed_hz = 1350000
-    adc = spi.xfer2([1,(8+canal_input_bateria)<<4,0])
-    data = ((adc[1]&3) << 8) + adc[2]
+    data = hardware.read_mcp3008(spi, canal_input_bateria)
 
     nivel_bateria = data*5.0/1023
     
-    try:
-        doc_ref = db.collection(u'rillo-main').document(u'nivel-bateria')
-        doc_ref.update({
-            u'bateria': nivel_bateria
-        })
-    except:
-        print("error, no puede acceder a la base de datos al enviar el nivel de la bateria")
+    escritura.update(doc_bateria, {u'bateria': nivel_bateria})
 
     if nivel_bateria >= 3.4:
 
@@ -207,16 +233,14 @@ def modo_analogico():
     #En este modo Rillo recibe y procesa datos desde la camara
     print("modo analogico")
 
-    #encender camara %?
-    print("camara encendida")
+    if lectura is not None:
+        try:
+            camara.start()
+            print("camara encendida")
+        except RuntimeError as error:
+            print(f"error, no se pudo abrir la camara ({error})")
 
-    try:
-        doc_ref = db.collection(u'rillo-main').document(u'funciones')
-        doc_ref.update({
-            u'conectado': False
-        })
-    except:
-        print("error, imposible acceder a la base de datos al tratar de escribir el nivel de bateria estando en el modo digital")
+    escribir_funciones({u'conectado': False})
 
     global t_sleep, t_lectura_bateria, modo_actual
 
@@ -224,62 +248,64 @@ def modo_analogico():
     potencia_leds_camara(0)
     led_activacion('verde')      
    
-    try:
-        doc_ref = db.collection(u'rillo-main').document(u'funciones').get()
-        funciones = doc_ref.to_dict()
+    if canal_funciones.get('recibido', True):
+        pass
+    else:
+        modo_digital()
 
-        if funciones['recibido']:
-            pass
-        else:
-            modo_digital()
-    
-    except:
-        print("error, no se puede acceder a la base de datos en el modo analogico")
-
-    lectura_camara = camera_reader(ocr_model)
-
-    try:
-        doc_ref = db.collection(u'rillo-main').document(u'funciones')
-        doc_ref.update({
-            u'dato': lectura_camara,
-            u'funcion': "camara"
-        })
-    except:
-        print("error, imposible acceder a la base de datos al tratar de escribir el nivel de bateria estando en el modo digital")
-
-    try:
-        braille_cell.writer(lectura_camara)
-    except:
-        print("Error: la letra leida por la camara no pudo ser representada en la celda braille")
+    # Los textos nuevos se escriben en la celda y se suben a la base de datos (subir_lectura) desde los hilos de la lectura
+    if lectura is not None:
+        try:
+            lectura.start()
+        except RuntimeError as error:
+            print(f"error, no se pudo iniciar la lectura de la camara ({error})")
     
     #Revisar si en la base de datos hubo un cambio, si lo hubo entrar al modo digital      
     medir_bateria()
 
-    time.sleep(t_sleep)
+    t_ini_analogico = time.time()
+    t_ini_bateria = t_ini_analogico
+
+    # Se sigue leyendo hasta que pasan t_sleep segundos sin textos nuevos, los comandos de la app y la bateria se
+    # revisan mientras tanto porque con textos llegando la lectura puede seguir indefinidamente.
+    # Sin lectura solo se esperan los comandos de la app durante t_sleep segundos
+    while time.time() - (t_ini_analogico if lectura is None else lectura.last_activity) < t_sleep:
+
+        canal_funciones.wait(t_espera_comandos)
+
+        if canal_funciones.get('recibido', True):
+            pass
+        else:
+            modo_digital()
+            return
+
+        if time.time() - t_ini_bateria >= t_lectura_bateria:
+            medir_bateria()
+            t_ini_bateria = time.time()
+
     modo_sleep()
 
+def subir_lectura(lectura_camara):
+    escribir_funciones({u'dato': lectura_camara, u'funcion': "camara"})
+
 def modo_digital():
     print("modo digital")
     #En este modo Rillo recibe y envia datos a un servidor de firebase que se comunica con la app
 
-    #apagar camara %?
+    # La celda queda para la app, la camara sigue abierta hasta el modo sleep
+    if lectura is not None:
+        lectura.stop()
     print("camara apagada")
 
-    try:
-        doc_ref = db.collection(u'rillo-main').document(u'funciones')
-        doc_ref.update({
-            u'conectado': True
-            
-        })
-    except:
-        print("error, no puede acceder a la base de datos al tratar de escribir el nivel de bateria estando en el modo digital")
+    escribir_funciones({u'conectado': True})
             
     global t_sleep, modo_actual
 
     modo_actual = "digital"
 
     potencia_leds_camara(1)
-    braille_cell.trigger([0,0,0,0,0,1])
+    # Sin bloquear, la celda puede estar terminando un texto y el ciclo de comandos no debe esperarla
+    braille_cell.trigger(0b100000, block=False)
     led_activacion('azul')
     
     t_ini_ejecucion = time.time()
@@ -290,35 +316,29 @@ def modo_digital():
 
     while t_ejecucion <= t_sleep:
         
-        try:
-            doc_ref = db.collection(u'rillo-main').document(u'funciones').get()
-            funciones = doc_ref.to_dict()
-        except:
-            print("error, no se puede acceder a la base de datos en el modo digital")
+        # Se despierta con cada cambio del documento o cada t_espera_comandos segundos para revisar los tiempos
+        canal_funciones.wait(t_espera_comandos)
+        funciones = canal_funciones.fields()
 
-        if funciones['recibido']:
+        if funciones.get('recibido', True):
             pass
         else:
             representar_datos(funciones['funcion'], funciones['dato'])
             t_ini_ejecucion = time.time()
        
-        if funciones['conectado']:
+        if funciones.get('conectado', True):
             pass
         else:
             modo_analogico()
 
         if t_bateria >= t_lectura_bateria:
-                        
-            try:
-                doc_ref = db.collection(u'rillo-main').document(u'nivel-bateria')
-                doc_ref.update({
-                    u'bateria': nivel_bateria
-                })
-            except:
-                print("error, no puede acceder a la base de datos al tratar de escribir el nivel de bateria estando en el modo digital")
-            
+            escritura.update(doc_bateria, {u'bateria': nivel_bateria})
             t_ini_bateria = time.time()
 
+        # El tiempo de inactividad cuenta desde que la celda termina de reproducir
+        if reproduccion_actual is not None and not reproduccion_actual.done():
+            t_ini_ejecucion = time.time()
+
         t_ejecucion = time.time() - t_ini_ejecucion
         t_bateria = time.time() - t_ini_bateria
 
@@ -327,7 +347,10 @@ def modo_digital():
 def modo_sleep():
     """ En este modo se apaga la camara, los leds de la camara y """
     print("modo sleep")
-    # apagar_camara() %?
+    if lectura is not None:
+        lectura.stop()
+    camara.release()
+    detector_cambios.reset()
     print("camara apagada") 
 
     global t_lectura_bateria, t_shutdown, modo_actual, interrupcion_activo, stop_parpadeo_led
@@ -344,30 +367,17 @@ def modo_sleep():
 
     while (t_ejecucion <= t_shutdown) and modo_actual == "sleep":
 
-        try:
-            doc_ref = db.collection(u'rillo-main').document(u'funciones').get()
-            funciones = doc_ref.to_dict()
+        canal_funciones.wait(t_espera_comandos)
 
-            if funciones['recibido']:
-                pass
-            else:
-                stop_parpadeo_led = True
-                modo_digital()
-        
-        except:
-            print("error, no se puede acceder a la base de datos en el modo sleep")
+        if canal_funciones.get('recibido', True):
+            pass
+        else:
+            stop_parpadeo_led = True
+            modo_digital()
 
 
         if t_bateria >= t_lectura_bateria:
-                        
-            try:
-                doc_ref = db.collection(u'rillo-main').document(u'nivel-bateria')
-                doc_ref.update({
-                    u'bateria': nivel_bateria
-                })
-            except:
-                print("error, no puede acceder a la base de datos al tratar de escribir el nivel de bateria estando en el modo digital")
-            
+            escritura.update(doc_bateria, {u'bateria': nivel_bateria})
             t_ini_bateria = time.time()
         
         t_ejecucion = time.time() - t_ini
@@ -415,7 +425,7 @@ def boton_nivel_bateria(gpio, level, tick):
 
     print(f"\nnivel de bateria: {nivel_bateria}\n")
 
-    niveles_bateria_braille = [[0, 0, 1, 0, 0, 1], [0, 1, 0, 0, 1, 0], [1, 0, 0, 1, 0, 0]]
+    niveles_bateria_braille = [0b100100, 0b010010, 0b001001]     # puntos 3-6, 2-5 y 1-4
 
     current_braille_parameters = braille_cell.parameters()
     braille_cell.parameters(4, 0.5, 0.5, 1)
@@ -439,20 +449,21 @@ def boton_nivel_bateria(gpio, level, tick):
 
 
 def datos_recibidos():
-    try:
-        doc_ref = db.collection(u'rillo-main').document(u'funciones')
-        doc_ref.update({
-            u'recibido': 1
-        })
-    except:
-        print("error, no puede acceder a la base de datos al confirmar que se recibió un dato")
+    escribir_funciones({u'recibido': 1})
+
+def escribir_funciones(campos):
+    # La copia local del canal se actualiza primero, el evento de esta escritura no vuelve a disparar el comando.
+    # Se envia de inmediato, un comando de la app que llegue mientras espera seria tapado por ella
+    canal_funciones.set_local(campos)
+    escritura.update(doc_funciones, campos, urgent=True)
     
 def representar_datos(funcion, datos):
     print("representar datos")
-    
+
+    global reproduccion_actual
 
     if funcion == 'escribir':
-        braille_cell.writer(datos)
+        reproduccion_actual = braille_cell.writer(datos, block=False)
         datos_recibidos()
 
     elif funcion == 'perfil_vibracion':
@@ -461,23 +472,28 @@ def representar_datos(funcion, datos):
         braille_cell.time_off = datos[2]
         braille_cell.signal_type = datos[3]
 
-        datos_csv = [['intensidad', braille_cell.power],['tiempo_on',braille_cell.time_on], ['tiempo_off', braille_cell.time_off], ['signnal', braille_cell.signal_type]]
+        # El quinto dato (opcional) activa la escritura con braille contraido (grado 2)
+        if len(datos) > 4:
+            braille_cell.contractor = braille_contractions.Contractor() if datos[4] else None
+
+        datos_csv = [['intensidad', braille_cell.power],['tiempo_on',braille_cell.time_on], ['tiempo_off', braille_cell.time_off], ['signnal', braille_cell.signal_type], ['contracciones', int(braille_cell.contractor is not None)], ['perfil_ocr', perfil_ocr]]
 
         with open('variables_rillo.csv', 'w', newline='') as myFile:
             writer = csv.writer(myFile)
             writer.writerows(datos_csv)
 
         
-        braille_cell.trigger([0,0,0,0,0,1])
+        reproduccion_actual = braille_cell.trigger(0b100000, block=False)
 
         datos_recibidos()
 
     elif funcion == 'generador':
-        braille_cell.generator()
+        reproduccion_actual = braille_cell.generator(block=False)
         datos_recibidos()
 
     elif funcion == 'celda':
-        braille_cell.trigger(datos)
+        # datos puede ser la lista de 6 puntos o el patron empaquetado en un solo byte/entero
+        reproduccion_actual = braille_cell.trigger(datos, block=False)
         datos_recibidos()
 
     elif funcion == "nope":
@@ -487,7 +503,7 @@ def representar_datos(funcion, datos):
         print("error, funcion no identificada en la lectura de datos digitales")
 
 #interrupciones
-interrupcion_bateria = pigpio_controller.callback(pin_boton_bateria, GPIO.RISING_EDGE, modo_analogico)
+interrupcion_bateria = pigpio_controller.callback(pin_boton_bateria, hardware.RISING_EDGE, modo_analogico)
 saludo()
 
 try:
@@ -0,0 +1,210 @@
+""" Buffer the Firestore writes of rillo and send them together every few seconds.
+
+The updates of the same document are merged while they wait, so a field written several times is sent once with its
+last value, and all the documents are written with one batched commit. Numeric fields with a threshold, Ex. the
+battery voltage, are only sent when they move past it from the value last sent.
+
+Ex.
+    buffer = WriteBuffer(db.batch, interval=2.0, thresholds={u'bateria': 0.05})
+    buffer.start()
+    buffer.update(db.collection(u'rillo-main').document(u'nivel-bateria'), {u'bateria': 3.71})
+"""
+
+import threading
+
+class WriteBuffer:
+    """Write-behind buffer of Firestore document updates.
+
+    Attributes
+    ----------
+    batch : callable
+        Creates a write batch with update(document, fields) and commit(), Ex. db.batch or command_channel.FakeBatch.
+    interval : float
+        Seconds between two flushes of the background thread, by default 2.0
+    thresholds : dict
+        Field name -> minimum change of its value to be sent, by default {} (every change is sent)
+    on_commit : callable
+        Called with (document, fields) of every document sent after a successful commit, Ex.
+        CommandChannel.committed, by default None
+    commits : int
+        Batches committed.
+    merged : int
+        Field updates replaced by a newer value before they were sent.
+    dropped : int
+        Field updates dropped because they didn't move past their threshold.
+
+    Methods
+    -------
+    update
+        Queue a document update.
+    flush
+        Send the pending updates now.
+    start
+        Start flushing every interval seconds in a background thread.
+    stop
+        Stop the background thread and send the pending updates.
+    """
+
+    def __init__(self, batch, interval: float=2.0, thresholds: dict=None, on_commit=None):
+        self.batch = batch
+        self.interval = interval
+        self.thresholds = thresholds or {}
+        self.on_commit = on_commit
+        self.commits = 0
+        self.merged = 0
+        self.dropped = 0
+
+        # Document path -> (document reference, pending fields)
+        self._pending = {}
+        # (document path, field) -> last value sent of the fields with a threshold
+        self._sent = {}
+        # Paths of the documents whose last write failed, they are committed on their own until one succeeds
+        self._failing = set()
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return f"WriteBuffer({len(self._pending)} pending documents, commits={self.commits}, merged={self.merged}, dropped={self.dropped})"
+
+    @staticmethod
+    def _path(document) -> str:
+        # References to the same document are different objects, Ex. db.collection(...).document(...) in every call
+        return getattr(document, "path", None) or str(id(document))
+
+    def update(self, document, fields: dict, urgent: bool=False):
+        """Queue a document update, merged with the pending updates of the same document.
+
+        Parameters
+        ----------
+        document : google.cloud.firestore.DocumentReference or command_channel.FakeDocument
+            Document to update.
+        fields : dict
+            Fields and their new values, Ex. {u'bateria': 3.71}
+        urgent : bool, optional
+            Wake the background thread to flush now instead of at the end of the interval, by default False
+        """
+
+        path = self._path(document)
+        with self._lock:
+            pending = self._pending.setdefault(path, (document, {}))[1]
+            for field, value in fields.items():
+                threshold = self.thresholds.get(field)
+                last = self._sent.get((path, field))
+                if threshold is not None and last is not None and field not in pending and abs(value - last) < threshold:
+                    self.dropped += 1
+                    continue
+
+                if field in pending:
+                    self.merged += 1
+                pending[field] = value
+                if threshold is not None:
+                    self._sent[(path, field)] = value
+
+            if not pending:
+                del self._pending[path]
+
+        if urgent:
+            self._wake.set()
+
+    def pending(self) -> dict:
+        """Copy of the pending fields of each document path."""
+        with self._lock:
+            return {path: dict(fields) for path, (document, fields) in self._pending.items()}
+
+    def flush(self) -> bool:
+        """Send the pending updates in one batch.
+
+        A batch is atomic, if it fails its documents are committed one by one so a document that can't be written,
+        Ex. one that doesn't exist, doesn't hold back the others. The documents that failed are committed on their
+        own in the next flushes until they are written.
+
+        Returns
+        -------
+        sent: bool
+            False if some document failed, its updates are kept to be sent in the next flush unless newer ones replace them.
+        """
+
+        with self._flushing:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            if not pending:
+                return True
+
+            together = {path: update for path, update in pending.items() if path not in self._failing}
+            alone = [path for path in pending if path in self._failing]
+            if len(together) == 1:
+                alone += list(together)
+            elif together:
+                error = self._commit(together)
+                if error is not None:
+                    print(f"ERROR: firestore batch write failed ({error!r}), the documents are written one by one")
+                    alone += list(together)
+
+            sent = True
+            for path in alone:
+                error = self._commit({path: pending[path]})
+                if error is None:
+                    self._failing.discard(path)
+                    continue
+
+                print(f"ERROR: firestore write of {path} failed ({error!r}), it will be retried")
+                sent = False
+                self._failing.add(path)
+                with self._lock:
+                    document, fields = pending[path]
+                    newer = self._pending.get(path, (document, {}))[1]
+                    self._pending[path] = (document, {**fields, **newer})
+            return sent
+
+    def _commit(self, updates: dict):
+        """Commit the updates of some documents in one batch, returns the exception if it failed or None."""
+
+        try:
+            batch = self.batch()
+            for document, fields in updates.values():
+                batch.update(document, fields)
+            batch.commit()
+        except Exception as error:
+            return error
+
+        self.commits += 1
+        if self.on_commit is not None:
+            for document, fields in updates.values():
+                try:
+                    self.on_commit(document, fields)
+                except Exception as error:
+                    print(f"ERROR: on_commit failed ({error!r})")
+        return None
+
+    def start(self):
+        """Start flushing every interval seconds in a background thread, does nothing if it is running."""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="firestore-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and send the pending updates."""
+
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.flush()